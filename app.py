@@ -1,30 +1,26 @@
 # === IMPORTS AND SETUP ===
 import streamlit as st
-import docx
-from docx import Document
 from datetime import datetime
-from docx.oxml.ns import qn
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
-import io
-import os
-import pypandoc
-import json
-import requests
-from PIL import Image
-import io
-import re
-import lxml.etree as ET
-import tempfile
-import zipfile
-import shutil
+from invoice_engine.document import InvoiceData, render_docx, invoice_filenames
+from invoice_engine.model import complete_items, compute_financials, format_currency, items_from_csv
+from invoice_engine.pdf import get_converter
+from invoice_engine.jobs import DONE, FAILED, QueueFullError, RenderJobQueue
+from invoice_engine.render_cache import artifact_key, get_artifact_cache
+from invoice_engine.reproducible import content_hash
+from invoice_engine.template import DEFAULT_TEMPLATE, get_template_registry, template_for
+from invoice_engine.store import get_store
+from invoice_engine.numbering import get_allocator, is_valid_invoice_number
+from invoice_engine.assets import start_prefetch
+from invoice_engine.metrics import recording, start_metrics_server
 
 # Set page config as the FIRST Streamlit command
 st.set_page_config(page_title="Invoice Generator", page_icon="📄", layout="wide")
 
+# Fetch the PAID stamp and signature once per process, off the request path
+start_prefetch()
+# Prometheus text endpoint for the render metrics (INVOICE_METRICS_PORT, 0 disables)
+start_metrics_server()
+
 # Custom CSS for muted colors, rounded layout, and depth
 st.markdown("""
     <style>
@@ -123,67 +119,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # === UTILITY CLASSES AND FUNCTIONS ===
-class InvoiceData:
-    def __init__(self):
-        self.client_info = {}
-        self.invoice_details = {}
-        self.items = []
-        self.financials = {}
-        self.apply_late_fee = False
-        self.mark_as_paid = False
-        self.invoice_number = ""
-        self.signature = ""
-
-    def to_dict(self):
-        return {
-            "client_info": self.client_info,
-            "invoice_details": self.invoice_details,
-            "items": self.items,
-            "financials": self.financials,
-            "apply_late_fee": self.apply_late_fee,
-            "mark_as_paid": self.mark_as_paid,
-            "invoice_number": self.invoice_number,
-            "signature": self.signature
-        }
-
-    @staticmethod
-    def from_dict(data):
-        invoice = InvoiceData()
-        invoice.client_info = data.get("client_info", {})
-        invoice.invoice_details = data.get("invoice_details", {})
-        invoice.items = data.get("items", [])
-        invoice.financials = data.get("financials", {})
-        invoice.apply_late_fee = data.get("apply_late_fee", False)
-        invoice.mark_as_paid = data.get("mark_as_paid", False)
-        invoice.invoice_number = data.get("invoice_number", "")
-        invoice.signature = data.get("signature", "")
-        return invoice
-
-def format_currency(amount):
-    if amount == 0:
-        return ""
-    elif amount == int(amount):
-        return f"Rp {int(amount):,}"
-    else:
-        return f"Rp {amount:,.2f}"
-
-def get_next_invoice_number():
-    count_file = "invoice_count.txt"
-    year = "2025"
-    if os.path.exists(count_file):
-        with open(count_file, 'r') as f:
-            try:
-                count = int(f.read().strip())
-            except ValueError:
-                count = 0
-    else:
-        count = 0
-    count += 1
-    return f"INV{year}{count:03d}", count
-
-def save_invoice_count(count):
-    with open("invoice_count.txt", 'w') as f:
-        f.write(str(count))
+INVOICE_PAGE_SIZE = 25
 
 def validate_date_format(date_str):
     try:
@@ -193,362 +129,114 @@ def validate_date_format(date_str):
         return False
 
 def save_invoice_data(invoice_data):
-    invoice_db = "invoices.json"
-    if os.path.exists(invoice_db):
-        with open(invoice_db, 'r') as f:
-            invoices = json.load(f)
-    else:
-        invoices = {}
-
-    invoices[invoice_data.invoice_number] = invoice_data.to_dict()
-    with open(invoice_db, 'w') as f:
-        json.dump(invoices, f, indent=4)
+    get_store().put(invoice_data)
 
 def load_invoice_data():
-    invoice_db = "invoices.json"
-    if os.path.exists(invoice_db):
-        with open(invoice_db, 'r') as f:
-            data = json.load(f)
-        return {k: InvoiceData.from_dict(v) for k, v in data.items()}
-    return {}
-
-def sanitize_filename(name):
-    # Remove or replace characters that are invalid in file names
-    return re.sub(r'[<>:"/\\|?*]', '_', name).replace(' ', '_')
-
-# === DOCUMENT STYLING FUNCTIONS ===
-def set_cell_border(cell, side, color="FFFFFF", sz=4):
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    side_mapping = {
-        'top': 'top', 'bottom': 'bottom', 'left': 'left', 'right': 'right'
-    }
-    border_name = side_mapping.get(side.lower())
-    if border_name:
-        border = parse_xml(f'<w:{border_name} {nsdecls("w")} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
-        tcBorders = tcPr.first_child_found_in("w:tcBorders")
-        if tcBorders is None:
-            tcBorders = parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>')
-            tcPr.append(tcBorders)
-        tcBorders.append(border)
-
-def set_white_borders(cell, sz=4):
-    for border in ['top', 'bottom', 'left', 'right']:
-        set_cell_border(cell, border, color="FFFFFF", sz=sz)
-
-def set_cell_font(cell, font_name="Courier New", font_size=10):
-    for paragraph in cell.paragraphs:
-        for run in paragraph.runs:
-            run.font.name = font_name
-            run.font.size = Pt(font_size)
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-
-def apply_cell_style(cell, bg_color="#ddefd5"):
-    shading_elm = parse_xml(f'<w:shd {nsdecls("w")} w:fill="{bg_color}" />')
-    cell._tc.get_or_add_tcPr().append(shading_elm)
-    set_white_borders(cell, sz=6)
-    set_cell_font(cell)
-
-def style_financial_table(doc, invoice_data):
-    financial_table = doc.tables[1]
-    for row in financial_table.rows:
-        for cell in row.cells:
-            set_white_borders(cell)
-            set_cell_font(cell)
-        for paragraph in row.cells[1].paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    if invoice_data.apply_late_fee:
-        late_fee_cell = financial_table.rows[3].cells[0]
-        if "LATE FEE" in late_fee_cell.text:
-            original_text = late_fee_cell.text
-            late_fee_cell.text = ""
-            paragraph = late_fee_cell.paragraphs[0]
-            run = paragraph.add_run(original_text)
-            run.font.color.rgb = RGBColor.from_string('d95132')
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
-
-# === INVOICE GENERATION LOGIC ===
-def replace_placeholders(doc, replacements):
-    for paragraph in doc.paragraphs:
-        for key, value in replacements.items():
-            if key in paragraph.text:
-                paragraph.text = paragraph.text.replace(key, value)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for key, value in replacements.items():
-                    if key in cell.text:
-                        cell.text = cell.text.replace(key, value)
-    return doc
-
-def update_items_table(doc, items):
-    items_table = doc.tables[0]
-    for i in range(len(items_table.rows)):
-        for cell in items_table.rows[i].cells:
-            set_white_borders(cell, sz=6)
-    while len(items_table.rows) > 2:
-        items_table._tbl.remove(items_table.rows[2]._tr)
-    placeholder_row = items_table.rows[1]
-    for item in items:
-        row = items_table.add_row()
-        row.cells[0].text = item['description']
-        row.cells[1].text = format_currency(item['unit_price'])
-        quantity = item['quantity']
-        if quantity == int(quantity):
-            row.cells[2].text = str(int(quantity))
-        else:
-            row.cells[2].text = str(quantity)
-        row.cells[3].text = format_currency(item['total'])
-        for i, cell in enumerate(row.cells):
-            apply_cell_style(cell)
-            alignments = [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.RIGHT, 
-                         WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = alignments[i]
-    items_table._tbl.remove(placeholder_row._tr)
-    return doc
+    return get_store().load_all()
 
 def generate_invoice(invoice_data):
-    doc = Document('Invoice_Template_MarketixLab.docx')
-    replacements = {**invoice_data.client_info, **invoice_data.invoice_details, **invoice_data.financials}
-    if invoice_data.apply_late_fee:
-        replacements['{{LATE FEE:}}'] = 'LATE FEE'
-    else:
-        replacements['{{LATE FEE:}}'] = ''
-        replacements['[latefee]'] = ''
-    doc = replace_placeholders(doc, replacements)
-    doc = update_items_table(doc, invoice_data.items)
-    style_financial_table(doc, invoice_data)
-
-    if invoice_data.mark_as_paid:
-        doc = add_paid_stamp_and_signature(doc)
-
-    for paragraph in doc.paragraphs:
-        for run in paragraph.runs:
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
-    
-    docx_output = io.BytesIO()
-    doc.save(docx_output)
-    docx_output.seek(0)
-    
-    temp_docx = f"temp_{invoice_data.invoice_number}.docx"
-    temp_pdf = f"temp_{invoice_data.invoice_number}.pdf"
-    doc.save(temp_docx)
-    
-    pypandoc.convert_file(temp_docx, 'pdf', outputfile=temp_pdf)
-    
-    pdf_output = io.BytesIO()
-    with open(temp_pdf, 'rb') as f:
-        pdf_output.write(f.read())
-    pdf_output.seek(0)
-    
-    if os.path.exists(temp_docx):
-        os.remove(temp_docx)
-    if os.path.exists(temp_pdf):
-        os.remove(temp_pdf)
-    
-    # Generate file names based on paid status and client name
-    client_name = sanitize_filename(invoice_data.client_info['{{client_name}}'])
-    prefix = "Paid_Invoice" if invoice_data.mark_as_paid else "Invoice"
-    base_filename = f"{prefix}_{invoice_data.invoice_number}_{client_name}"
-    docx_filename = f"{base_filename}.docx"
-    pdf_filename = f"{base_filename}.pdf"
-    
-    return (docx_output, docx_filename, pdf_output, pdf_filename)
-
-# === STAMP AND SIGNATURE FUNCTIONS ===
-# Direct download URLs for the stamp and signature images
-PAID_STAMP_URL = "https://drive.google.com/uc?export=download&id=1W9PL0DtP0TUk7IcGiMD_ZuLddtQ8gjNo"
-SIGNATURE_URL = "https://drive.google.com/uc?export=download&id=1b6Dcg4spQmvLUMd4neBtLNfdr5l7QtPJ"
-
-def fetch_image(url):
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        session = requests.Session()
-        response = session.get(url, headers=headers, stream=True, allow_redirects=True)
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch image from {url}. Status code: {response.status_code}")
-
-        content_type = response.headers.get('Content-Type', '')
-        if not content_type.startswith('image/'):
-            response_text = response.text
-            if "google.com" in response_text and "confirm=" in response_text:
-                confirm_match = re.search(r'confirm=([a-zA-Z0-9\-_]+)', response_text)
-                if confirm_match:
-                    confirm_token = confirm_match.group(1)
-                    confirm_url = f"{url}&confirm={confirm_token}"
-                    response = session.get(confirm_url, headers=headers, stream=True, allow_redirects=True)
-                    content_type = response.headers.get('Content-Type', '')
-                    if not content_type.startswith('image/'):
-                        response_content = response.text[:200]
-                        raise Exception(
-                            f"URL {url} still did not return an image after confirmation. "
-                            f"Content-Type: {content_type}. "
-                            f"Response preview: {response_content}"
-                        )
-                else:
-                    response_content = response_text[:200]
-                    raise Exception(
-                        f"URL {url} returned a confirmation page, but no confirmation token found. "
-                        f"Content-Type: {content_type}. "
-                        f"Response preview: {response_content}"
-                    )
-            else:
-                response_content = response_text[:200]
-                raise Exception(
-                    f"URL {url} did not return an image. "
-                    f"Content-Type: {content_type}. "
-                    f"Response preview: {response_content}"
-                )
-
-        image_data = io.BytesIO(response.content)
-        img = Image.open(image_data)
-        img.verify()
-        image_data.seek(0)
-        
-        return image_data
-
-    except Exception as e:
-        raise Exception(f"Error fetching image from {url}: {str(e)}")
+    # Serialized once; the same bytes feed the download and the PDF converter
+    docx_bytes = render_docx(invoice_data, "web")
+
+    docx_filename, pdf_filename = invoice_filenames(invoice_data)
+
+    return (docx_bytes, docx_filename, pdf_filename)
+
+def generate_invoice_pdf(docx_bytes):
+    with recording("pdf") as metrics:
+        result = get_converter().convert(docx_bytes)
+        metrics.add_stage("pdf_queue_wait", result.wait_ms / 1000)
+        metrics.add_stage("pdf_convert", result.convert_ms / 1000)
+        metrics.size("pdf", len(result.pdf))
+    return result.pdf
+
+@st.cache_resource
+def get_render_queue():
+    # One queue per server process, shared by every session
+    return RenderJobQueue()
+
+def render_for_download(invoice_data, cache_key=None):
+    # An unchanged invoice is served from the artifact cache; any edit changes the key
+    cache_key = cache_key or artifact_key(invoice_data, template_for(invoice_data))
+    docx_bytes = get_artifact_cache().get_or_render(cache_key, "docx", lambda: generate_invoice(invoice_data)[0])
+    docx_filename, pdf_filename = invoice_filenames(invoice_data)
+    return {
+        "invoice_number": invoice_data.invoice_number,
+        "docx": docx_bytes,
+        "docx_filename": docx_filename,
+        "pdf_filename": pdf_filename,
+        "digest": cache_key,
+        # Output is byte-reproducible, so identical documents share one PDF artifact
+        "content_hash": content_hash(docx_bytes)
+    }
 
-def add_paid_stamp_and_signature(doc):
-    try:
-        # Fetch images from the URLs
-        stamp_data = fetch_image(PAID_STAMP_URL)
-        signature_data = fetch_image(SIGNATURE_URL)
-
-        # Save images to temporary files
-        stamp_tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-        signature_tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-
-        # Process stamp image
-        stamp_img = Image.open(stamp_data)
-        stamp_img.save(stamp_tmp.name, format="PNG")
-        stamp_tmp.close()
-        if not os.path.exists(stamp_tmp.name):
-            raise Exception(f"Stamp temporary file {stamp_tmp.name} does not exist")
-        if not os.access(stamp_tmp.name, os.R_OK):
-            raise Exception(f"Stamp temporary file {stamp_tmp.name} is not readable")
-
-        # Process signature image
-        signature_img = Image.open(signature_data)
-        signature_img.save(signature_tmp.name, format="PNG")
-        signature_tmp.close()
-        if not os.path.exists(signature_tmp.name):
-            raise Exception(f"Signature temporary file {signature_tmp.name} does not exist")
-        if not os.access(signature_tmp.name, os.R_OK):
-            raise Exception(f"Signature temporary file {signature_tmp.name} is not readable")
-
-        # Add the stamp at the end of the document
-        stamp_paragraph = doc.add_paragraph()
-        stamp_run = stamp_paragraph.add_run()
-        stamp_picture = stamp_run.add_picture(stamp_tmp.name, width=Inches(2.17), height=Inches(2.17))
-
-        # Access the run's XML element to find the drawing element
-        stamp_run_element = stamp_run._r
-        stamp_drawing_elements = stamp_run_element.xpath('.//w:drawing')
-        if not stamp_drawing_elements:
-            raise Exception("Could not find drawing element for stamp image")
-        stamp_drawing = stamp_drawing_elements[0]
-
-        # Find the a:graphic element to preserve the image data
-        graphic_elements = stamp_drawing.xpath('.//a:graphic', namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
-        if not graphic_elements:
-            raise Exception("Could not find a:graphic element in stamp drawing")
-        graphic_xml = ET.tostring(graphic_elements[0], encoding='unicode').replace('\n', '')
-
-        # Use desired positions for stamp
-        stamp_horizontal = 5.09 * 914400  # 5.09" in EMUs
-        stamp_vertical = 6.64 * 914400    # 6.64" in EMUs
-
-        # Replace the inline drawing with an anchored one using "In Front of Text" wrapping
-        stamp_drawing.getparent().replace(stamp_drawing, parse_xml(f"""
-            <w:drawing
-                xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-                xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">
-                <wp:anchor distT="0" distB="0" distL="0" distR="0" simplePos="0" relativeHeight="251" behindDoc="0" locked="0" layoutInCell="1" allowOverlap="1">
-                    <wp:simplePos x="0" y="0"/>
-                    <wp:positionH relativeFrom="page">
-                        <wp:posOffset>{int(stamp_horizontal)}</wp:posOffset>
-                    </wp:positionH>
-                    <wp:positionV relativeFrom="page">
-                        <wp:posOffset>{int(stamp_vertical)}</wp:posOffset>
-                    </wp:positionV>
-                    <wp:extent cx="{int(2.17 * 914400)}" cy="{int(2.17 * 914400)}"/>
-                    <wp:effectExtent l="0" t="0" r="0" b="0"/>
-                    <wp:wrapTopAndBottom/>
-                    <wp:docPr id="1" name="Picture 1"/>
-                    <wp:cNvGraphicFramePr/>
-                    {graphic_xml}
-                </wp:anchor>
-            </w:drawing>
-        """))
-
-        # Add the signature at the end of the document
-        signature_paragraph = doc.add_paragraph()
-        signature_run = signature_paragraph.add_run()
-        signature_picture = signature_run.add_picture(signature_tmp.name, width=Inches(1.92), height=Inches(1.92))
-
-        # Access the run's XML element to find the drawing element
-        signature_run_element = signature_run._r
-        signature_drawing_elements = signature_run_element.xpath('.//w:drawing')
-        if not signature_drawing_elements:
-            raise Exception("Could not find drawing element for signature image")
-        signature_drawing = signature_drawing_elements[0]
-
-        # Find the a:graphic element to preserve the image data
-        graphic_elements = signature_drawing.xpath('.//a:graphic', namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
-        if not graphic_elements:
-            raise Exception("Could not find a:graphic element in signature drawing")
-        graphic_xml = ET.tostring(graphic_elements[0], encoding='unicode').replace('\n', '')
-
-        # Use desired positions for signature
-        signature_horizontal = 5.64 * 914400  # 5.64" in EMUs
-        signature_vertical = 8.11 * 914400    # 8.11" in EMUs
-
-        # Replace the inline drawing with an anchored one using "In Front of Text" wrapping
-        signature_drawing.getparent().replace(signature_drawing, parse_xml(f"""
-            <w:drawing
-                xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-                xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">
-                <wp:anchor distT="0" distB="0" distL="0" distR="0" simplePos="0" relativeHeight="252" behindDoc="0" locked="0" layoutInCell="1" allowOverlap="1">
-                    <wp:simplePos x="0" y="0"/>
-                    <wp:positionH relativeFrom="page">
-                        <wp:posOffset>{int(signature_horizontal)}</wp:posOffset>
-                    </wp:positionH>
-                    <wp:positionV relativeFrom="page">
-                        <wp:posOffset>{int(signature_vertical)}</wp:posOffset>
-                    </wp:positionV>
-                    <wp:extent cx="{int(1.92 * 914400)}" cy="{int(1.92 * 914400)}"/>
-                    <wp:effectExtent l="0" t="0" r="0" b="0"/>
-                    <wp:wrapTopAndBottom/>
-                    <wp:docPr id="2" name="Picture 2"/>
-                    <wp:cNvGraphicFramePr/>
-                    {graphic_xml}
-                </wp:anchor>
-            </w:drawing>
-        """))
-
-        # Clean up temporary files
-        if os.path.exists(stamp_tmp.name):
-            os.remove(stamp_tmp.name)
-        if os.path.exists(signature_tmp.name):
-            os.remove(signature_tmp.name)
-
-        return doc
-
-    except Exception as e:
-        # Clean up temporary files in case of failure
-        if 'stamp_tmp' in locals() and os.path.exists(stamp_tmp.name):
-            os.remove(stamp_tmp.name)
-        if 'signature_tmp' in locals() and os.path.exists(signature_tmp.name):
-            os.remove(signature_tmp.name)
-        raise Exception(f"Failed to add stamp and signature: {str(e)}")
+def prepare_pdf(rendered):
+    pdf_output = generate_invoice_pdf(rendered["docx"])
+    get_artifact_cache().put(rendered["content_hash"], "pdf", pdf_output)
+    return pdf_output
+
+def submit_render(invoice_data):
+    cache_key = artifact_key(invoice_data, template_for(invoice_data))
+    return get_render_queue().submit(("docx", cache_key), render_for_download, invoice_data, cache_key)
+
+def poll_job(job_id, label):
+    # The job's result once done; until then shows where it is. One check per
+    # rerun: the button reruns the page to look again, nothing sleeps
+    render_queue = get_render_queue()
+    job = render_queue.get(job_id)
+    if job is None:
+        st.warning(f"{label} is no longer available, please generate it again.")
+    elif job.status == FAILED:
+        st.error(f"An error occurred: {job.error}")
+    elif job.status == DONE:
+        return job.result
+    else:
+        position = render_queue.position(job_id)
+        if position:
+            st.info(f"{label}: waiting for {position} earlier job(s)...")
+        else:
+            st.info(f"{label}: rendering ({job.elapsed():.0f}s)...")
+        st.button("Check again", key=f"poll_{job_id}")
+    return None
+
+def show_downloads(key, rendered):
+    # The DOCX is ready immediately; the PDF is only converted when asked for, in
+    # the background, then kept in the artifact cache for reruns and later sessions.
+    artifact_cache = get_artifact_cache()
+    pdf_jobs = st.session_state.setdefault("pdf_jobs", {})
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="Download Invoice (DOCX)",
+            data=rendered["docx"],
+            file_name=rendered["docx_filename"],
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            key=f"{key}_docx"
+        )
+    with col2:
+        pdf_output = artifact_cache.get(rendered["content_hash"], "pdf")
+        job_id = pdf_jobs.get(rendered["content_hash"])
+        if pdf_output is None and job_id is not None:
+            pdf_output = poll_job(job_id, "PDF")
+            job = get_render_queue().get(job_id)
+            if job is None or job.status == FAILED:
+                # Offer the button again so the conversion can be retried
+                pdf_jobs.pop(rendered["content_hash"], None)
+                job_id = None
+        if pdf_output is None and job_id is None and st.button("Prepare PDF", key=f"{key}_prepare_pdf"):
+            try:
+                pdf_jobs[rendered["content_hash"]] = get_render_queue().submit(("pdf", rendered["content_hash"]), prepare_pdf, rendered)
+                st.experimental_rerun()
+            except QueueFullError as e:
+                st.error(str(e))
+        if pdf_output is not None:
+            st.download_button(
+                label="Download Invoice (PDF)",
+                data=pdf_output,
+                file_name=rendered["pdf_filename"],
+                mime="application/pdf",
+                key=f"{key}_pdf"
+            )
 
 # === STREAMLIT UI AND APP LOGIC ===
 st.title("📄 Invoice Generator")
@@ -559,6 +247,7 @@ tab1, tab2 = st.tabs(["Create Invoice", "View Invoices"])
 with tab1:
     if 'item_list' not in st.session_state:
         st.session_state.item_list = [{"description": "", "unit_price": 0.0, "quantity": 0.0}]
+        st.session_state.item_editor_version = 0
 
     if 'use_today' not in st.session_state:
         st.session_state.use_today = True
@@ -576,8 +265,9 @@ with tab1:
 
     st.header("Invoice Details")
     with st.form(key="invoice_form"):
-        default_invoice_number, invoice_count = get_next_invoice_number()
-        invoice_number = st.text_input("Invoice Number", value=default_invoice_number, help="Invoice number must start with 'INV2025'")
+        # Only a preview; the number is allocated when the invoice is generated
+        default_invoice_number = get_allocator().peek()
+        invoice_number = st.text_input("Invoice Number", value=default_invoice_number, help="Invoice number is 'INV', the year and a sequence number")
         
         st.session_state.use_today = st.checkbox("Use Today's Date", value=st.session_state.use_today, key="use_today_checkbox")
         if st.session_state.use_today:
@@ -594,6 +284,17 @@ with tab1:
         
         due_date_obj = st.date_input("Select Due Date", value=datetime.now(), key="due_date_picker")
         due_date = due_date_obj.strftime("%d.%m.%Y")
+
+        # Only offered when templates/ holds more than the bundled one
+        template_names = get_template_registry().names()
+        template_name = DEFAULT_TEMPLATE
+        if len(template_names) > 1:
+            template_name = st.selectbox(
+                "Template",
+                template_names,
+                index=template_names.index(DEFAULT_TEMPLATE) if DEFAULT_TEMPLATE in template_names else 0,
+                key="template_select"
+            )
         
         invoice_submit = st.form_submit_button("Save Invoice Details")
 
@@ -601,41 +302,39 @@ with tab1:
     if not isinstance(st.session_state.item_list, list):
         st.warning("Item list was corrupted. Resetting to default.")
         st.session_state.item_list = [{"description": "", "unit_price": 0.0, "quantity": 0.0}]
+        st.session_state.item_editor_version += 1
 
-    def add_item():
-        st.session_state.item_list.append({"description": "", "unit_price": 0.0, "quantity": 0.0})
-
-    def remove_item(index):
-        if len(st.session_state.item_list) > 1:
-            st.session_state.item_list.pop(index)
-
-    for i in range(len(st.session_state.item_list)):
-        col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-        with col1:
-            st.session_state.item_list[i]["description"] = st.text_input(
-                f"Description {i+1}",
-                value=st.session_state.item_list[i]["description"],
-                key=f"desc_{i}"
-            )
-        with col2:
-            st.session_state.item_list[i]["unit_price"] = st.number_input(
-                f"Unit Price {i+1}",
-                min_value=0.0,
-                value=st.session_state.item_list[i]["unit_price"],
-                key=f"price_{i}"
-            )
-        with col3:
-            st.session_state.item_list[i]["quantity"] = st.number_input(
-                f"Quantity {i+1}",
-                min_value=0.0,
-                value=st.session_state.item_list[i]["quantity"],
-                key=f"qty_{i}"
-            )
-        with col4:
-            if st.button("✕", key=f"delete_{i}"):
-                remove_item(i)
-
-    st.button("Add Item", on_click=add_item)
+    with st.expander("Import Items from CSV"):
+        items_file = st.file_uploader("CSV file with description, unit price and quantity columns", type=["csv", "txt"], key="items_csv")
+        items_text = st.text_area("Or paste rows, e.g. copied from a spreadsheet", key="items_paste")
+        if st.button("Replace Items"):
+            try:
+                imported = items_from_csv(items_file.getvalue().decode("utf-8-sig") if items_file is not None else items_text)
+                if not imported:
+                    st.error("No items found in the CSV")
+                else:
+                    st.session_state.item_list = imported
+                    # A new key starts the editor over from the imported rows
+                    st.session_state.item_editor_version += 1
+            except (ValueError, UnicodeDecodeError) as e:
+                st.error(f"Could not import items: {str(e)}")
+
+    # One grid widget over the item rows. Edits live in the widget's own
+    # state, so the list in session_state only changes on an import.
+    edited_items = st.data_editor(
+        st.session_state.item_list,
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "description": st.column_config.TextColumn("Description", width="large"),
+            "unit_price": st.column_config.NumberColumn("Unit Price", min_value=0.0),
+            "quantity": st.column_config.NumberColumn("Quantity", min_value=0.0)
+        },
+        key=f"item_editor_{st.session_state.item_editor_version}"
+    )
+    invoice_items = complete_items(edited_items)
+    subtotal = sum(item['total'] for item in invoice_items)
+    st.caption(f"{len(invoice_items)} of {len(edited_items)} rows complete - Subtotal: {format_currency(subtotal) or 'Rp 0'}")
 
     st.header("Financial Details")
     with st.form(key="financial_form"):
@@ -650,15 +349,20 @@ with tab1:
                 st.error("All client info fields are required")
             elif not all([invoice_number, invoice_date, due_date]):
                 st.error("All invoice details are required")
-            elif not invoice_number.startswith("INV2025"):
-                st.error("Invoice number must start with 'INV2025'")
+            elif not is_valid_invoice_number(invoice_number):
+                st.error(f"Invoice number must be 'INV', the year and a sequence number (e.g., {default_invoice_number})")
             elif not validate_date_format(invoice_date):
                 st.error("Invoice date must be in the format dd.mm.yyyy (e.g., 21.04.2025)")
             elif not validate_date_format(due_date):
                 st.error("Due date must be in the format dd.mm.yyyy (e.g., 28.04.2025)")
-            elif not st.session_state.item_list or not any(item["description"] and item["unit_price"] > 0 and item["quantity"] > 0 for item in st.session_state.item_list):
+            elif not invoice_items:
                 st.error("At least one valid item is required")
             else:
+                if invoice_number == default_invoice_number:
+                    # Another session may have taken the previewed number meanwhile
+                    invoice_number = get_allocator().allocate()
+                else:
+                    get_allocator().observe(invoice_number)
                 invoice_data = InvoiceData()
                 invoice_data.client_info = {
                     '{{client_name}}': client_name,
@@ -671,110 +375,109 @@ with tab1:
                     '{{invoice_date}}': invoice_date,
                     '{{due_date}}': due_date
                 }
-                invoice_data.items = [
-                    {
-                        'description': item['description'],
-                        'unit_price': item['unit_price'],
-                        'quantity': item['quantity'],
-                        'total': item['unit_price'] * item['quantity']
-                    } for item in st.session_state.item_list if item['description'] and item['unit_price'] > 0 and item['quantity'] > 0
-                ]
-                subtotal = sum(item['total'] for item in invoice_data.items)
-                tax = subtotal * (tax_rate / 100)
+                invoice_data.items = invoice_items
                 invoice_data.apply_late_fee = apply_late_fee
-                late_fee = subtotal * 0.02 if apply_late_fee else 0
-                total = subtotal + tax - discount + late_fee
-                invoice_data.financials = {
-                    '[subtotal]': format_currency(subtotal),
-                    '[tax]': format_currency(tax),
-                    '[discount]': format_currency(discount),
-                    '[latefee]': format_currency(late_fee),
-                    '[grandtotal]': format_currency(total)
-                }
+                invoice_data.financials = compute_financials(subtotal, tax_rate, discount, apply_late_fee)
                 invoice_data.invoice_number = invoice_number
+                if template_name != DEFAULT_TEMPLATE:
+                    invoice_data.template = template_name
                 save_invoice_data(invoice_data)
-                docx_output, docx_filename, pdf_output, pdf_filename = generate_invoice(invoice_data)
-                if invoice_number == default_invoice_number:
-                    save_invoice_count(invoice_count)
-                st.success(f"Invoice {invoice_number} generated and saved successfully!")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.download_button(
-                        label="Download Invoice (DOCX)",
-                        data=docx_output,
-                        file_name=docx_filename,
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    )
-                with col2:
-                    st.download_button(
-                        label="Download Invoice (PDF)",
-                        data=pdf_output,
-                        file_name=pdf_filename,
-                        mime="application/pdf"
-                    )
+                st.session_state.created_job = submit_render(invoice_data)
+                st.success(f"Invoice {invoice_number} saved successfully! Preparing the download...")
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
 
+    if "created_job" in st.session_state:
+        rendered = poll_job(st.session_state.created_job, "Invoice")
+        if rendered is not None:
+            show_downloads("created", rendered)
+
 with tab2:
     st.header("Previously Generated Invoices")
-    invoices = load_invoice_data()
-    if not invoices:
-        st.info("No invoices found.")
-    else:
+    store = get_store()
+
+    filter_col, client_col, overdue_col = st.columns(3)
+    with filter_col:
         # Add filter for paid/unpaid invoices
         filter_option = st.selectbox(
             "Filter Invoices",
             ["All Invoices", "Paid Invoices", "Unpaid Invoices"],
             key="invoice_filter"
         )
+    with client_col:
+        client_filter = st.text_input("Client Name Starts With", key="client_filter").strip()
+    with overdue_col:
+        overdue_only = st.checkbox("Overdue Only", key="overdue_filter")
+
+    # Filtering and paging happen in the store; only one page of summaries is read per rerun
+    paid_filter = {"Paid Invoices": True, "Unpaid Invoices": False}.get(filter_option)
+    if overdue_only:
+        paid_filter = False
+    filters = {
+        "paid": paid_filter,
+        "client": client_filter or None,
+        "due_before": datetime.now().date() if overdue_only else None
+    }
 
-        # Filter invoices based on selection
-        if filter_option == "Paid Invoices":
-            filtered_invoices = {k: v for k, v in invoices.items() if v.mark_as_paid}
-        elif filter_option == "Unpaid Invoices":
-            filtered_invoices = {k: v for k, v in invoices.items() if not v.mark_as_paid}
+    # Keyset pagination: keep the cursor of every page visited, start over when the filters change
+    filter_key = (filter_option, client_filter, overdue_only)
+    if st.session_state.get("invoice_filter_key") != filter_key:
+        st.session_state.invoice_filter_key = filter_key
+        st.session_state.invoice_cursors = [None]
+    cursors = st.session_state.invoice_cursors
+    page = store.query(after=cursors[-1], limit=INVOICE_PAGE_SIZE, **filters)
+
+    if not page.invoices:
+        if filter_key == ("All Invoices", "", False):
+            st.info("No invoices found.")
         else:
-            filtered_invoices = invoices
-
-        if not filtered_invoices:
             st.info(f"No {filter_option.lower()} found.")
-        else:
-            invoice_numbers = list(filtered_invoices.keys())
-            selected_invoice = st.selectbox("Select an Invoice", invoice_numbers, key="select_invoice")
-            if selected_invoice:
-                invoice_data = filtered_invoices[selected_invoice]
-                st.write(f"**Invoice Number:** {invoice_data.invoice_number}")
-                st.write(f"**Client Name:** {invoice_data.client_info['{{client_name}}']}")
-                st.write(f"**Date:** {invoice_data.invoice_details['{{invoice_date}}']}")
-                st.write(f"**Due Date:** {invoice_data.invoice_details['{{due_date}}']}")
-                st.write(f"**Total:** {invoice_data.financials['[grandtotal]']}")
-                st.write(f"**Paid Status:** {'Paid' if invoice_data.mark_as_paid else 'Not Paid'}")
-
-                if not invoice_data.mark_as_paid:
-                    if st.button(f"Mark {selected_invoice} as Paid"):
-                        invoice_data.mark_as_paid = True
-                        save_invoice_data(invoice_data)
-                        st.success(f"Invoice {selected_invoice} marked as paid!")
-                        st.experimental_rerun()
-
-                if st.button(f"Download {selected_invoice}"):
-                    try:
-                        docx_output, docx_filename, pdf_output, pdf_filename = generate_invoice(invoice_data)
-                        st.success(f"Invoice {selected_invoice} generated successfully!")
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.download_button(
-                                label="Download Invoice (DOCX)",
-                                data=docx_output,
-                                file_name=docx_filename,
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                            )
-                        with col2:
-                            st.download_button(
-                                label="Download Invoice (PDF)",
-                                data=pdf_output,
-                                file_name=pdf_filename,
-                                mime="application/pdf"
-                            )
-                    except Exception as e:
-                        st.error(f"An error occurred: {str(e)}")
+    else:
+        summaries = {summary.invoice_number: summary for summary in page.invoices}
+        selected_invoice = st.selectbox(
+            "Select an Invoice",
+            list(summaries),
+            format_func=lambda number: f"{number} - {summaries[number].client_name} - {summaries[number].grand_total}",
+            key="select_invoice"
+        )
+
+        prev_col, page_col, next_col = st.columns(3)
+        with prev_col:
+            if len(cursors) > 1 and st.button("Previous Page"):
+                cursors.pop()
+                st.experimental_rerun()
+        with page_col:
+            st.write(f"Page {len(cursors)}")
+        with next_col:
+            if page.next_cursor is not None and st.button("Next Page"):
+                cursors.append(page.next_cursor)
+                st.experimental_rerun()
+
+        if selected_invoice:
+            invoice_data = store.get(selected_invoice)
+            st.write(f"**Invoice Number:** {invoice_data.invoice_number}")
+            st.write(f"**Client Name:** {invoice_data.client_info['{{client_name}}']}")
+            st.write(f"**Date:** {invoice_data.invoice_details['{{invoice_date}}']}")
+            st.write(f"**Due Date:** {invoice_data.invoice_details['{{due_date}}']}")
+            st.write(f"**Total:** {invoice_data.financials['[grandtotal]']}")
+            st.write(f"**Paid Status:** {'Paid' if invoice_data.mark_as_paid else 'Not Paid'}")
+
+            viewed_invoices = st.session_state.setdefault("viewed_invoices", {})
+            if not invoice_data.mark_as_paid:
+                if st.button(f"Mark {selected_invoice} as Paid"):
+                    invoice_data.mark_as_paid = True
+                    save_invoice_data(invoice_data)
+                    viewed_invoices.pop(selected_invoice, None)
+                    st.success(f"Invoice {selected_invoice} marked as paid!")
+                    st.experimental_rerun()
+
+            if st.button(f"Download {selected_invoice}"):
+                try:
+                    viewed_invoices[selected_invoice] = submit_render(invoice_data)
+                except Exception as e:
+                    st.error(f"An error occurred: {str(e)}")
+
+            if selected_invoice in viewed_invoices:
+                rendered = poll_job(viewed_invoices[selected_invoice], f"Invoice {selected_invoice}")
+                if rendered is not None:
+                    show_downloads(f"view_{selected_invoice}", rendered)
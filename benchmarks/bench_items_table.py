@@ -0,0 +1,120 @@
+# Sweep the line-item count through update_items_table and compare with the
+# original add_row()/row.cells loop. Run from the repository root:
+#   python benchmarks/bench_items_table.py [counts...]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Pt
+
+from invoice_engine import load_template
+from invoice_engine.document import format_currency, update_items_table
+
+DEFAULT_COUNTS = [10, 100, 200, 1000, 10000]
+# The legacy loop is quadratic; past this it only measures patience
+LEGACY_LIMIT = 200
+
+
+# === ORIGINAL IMPLEMENTATION ===
+# The cell styling and item loop as they were before the bulk row builder,
+# with a parse_xml per border and per shading, so the comparison does not
+# pick up later speedups in styles.py.
+def legacy_set_cell_border(cell, side, color="FFFFFF", sz=4):
+    tc = cell._tc
+    tcPr = tc.get_or_add_tcPr()
+    side_mapping = {
+        'top': 'top', 'bottom': 'bottom', 'left': 'left', 'right': 'right'
+    }
+    border_name = side_mapping.get(side.lower())
+    if border_name:
+        border = parse_xml(f'<w:{border_name} {nsdecls("w")} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
+        tcBorders = tcPr.first_child_found_in("w:tcBorders")
+        if tcBorders is None:
+            tcBorders = parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>')
+            tcPr.append(tcBorders)
+        tcBorders.append(border)
+
+
+def legacy_set_white_borders(cell, sz=4):
+    for border in ['top', 'bottom', 'left', 'right']:
+        legacy_set_cell_border(cell, border, color="FFFFFF", sz=sz)
+
+
+def legacy_set_cell_font(cell, font_name="Courier New", font_size=10):
+    for paragraph in cell.paragraphs:
+        for run in paragraph.runs:
+            run.font.name = font_name
+            run.font.size = Pt(font_size)
+            run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+
+
+def legacy_apply_cell_style(cell, bg_color="#ddefd5"):
+    shading_elm = parse_xml(f'<w:shd {nsdecls("w")} w:fill="{bg_color}" />')
+    cell._tc.get_or_add_tcPr().append(shading_elm)
+    legacy_set_white_borders(cell, sz=6)
+    legacy_set_cell_font(cell)
+
+
+def legacy_update_items_table(doc, items):
+    items_table = doc.tables[0]
+    for i in range(len(items_table.rows)):
+        for cell in items_table.rows[i].cells:
+            legacy_set_white_borders(cell, sz=6)
+    while len(items_table.rows) > 2:
+        items_table._tbl.remove(items_table.rows[2]._tr)
+    placeholder_row = items_table.rows[1]
+    for item in items:
+        row = items_table.add_row()
+        row.cells[0].text = item['description']
+        row.cells[1].text = format_currency(item['unit_price'])
+        quantity = item['quantity']
+        if quantity == int(quantity):
+            row.cells[2].text = str(int(quantity))
+        else:
+            row.cells[2].text = str(quantity)
+        row.cells[3].text = format_currency(item['total'])
+        for i, cell in enumerate(row.cells):
+            legacy_apply_cell_style(cell)
+            alignments = [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.RIGHT,
+                          WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]
+            for paragraph in cell.paragraphs:
+                paragraph.alignment = alignments[i]
+    items_table._tbl.remove(placeholder_row._tr)
+    return doc
+
+
+def make_items(count):
+    return [
+        {'description': f'Usage line {i}', 'unit_price': 1250.0, 'quantity': float(i % 7 + 1),
+         'total': 1250.0 * (i % 7 + 1)}
+        for i in range(count)
+    ]
+
+
+def measure(function, count):
+    template = load_template()
+    items = make_items(count)
+    doc = template.new_document()
+    started = time.perf_counter()
+    function(doc, items)
+    return time.perf_counter() - started
+
+
+def main(counts):
+    print(f"{'items':>8} {'bulk ms':>10} {'us/item':>8} {'legacy ms':>10}")
+    for count in counts:
+        elapsed = measure(update_items_table, count)
+        legacy = ''
+        if count <= LEGACY_LIMIT:
+            legacy = f"{measure(legacy_update_items_table, count) * 1000:.1f}"
+        per_item = elapsed / count * 1e6 if count else 0
+        print(f"{count:>8} {elapsed * 1000:>10.1f} {per_item:>8.1f} {legacy:>10}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS)
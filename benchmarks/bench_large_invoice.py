@@ -0,0 +1,117 @@
+# Peak memory of one very large invoice: line items streamed from a CSV with
+# StreamingRenderer.render_items, against the whole item list rendered into a
+# BytesIO. Each run is a fresh interpreter. Run from the repository root:
+#   python benchmarks/bench_large_invoice.py [--items 1000 10000 100000] [--check]
+# --check exits non-zero when the streamed peak grows with the item count;
+# tests/test_large_invoice.py runs the same probe from 1k to 20k items.
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_ITEM_COUNTS = [1000, 10000, 100000]
+# Allowed growth of the streamed peak from the smallest to the largest count
+CHECK_SLACK_MB = 4.0
+
+_PROBE = '''
+import json, os, resource, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+from benchmarks.bench_large_invoice import sample_invoice
+from invoice_engine.batch import read_items
+from invoice_engine.model import compute_financials
+from invoice_engine.ooxml import get_streaming_renderer
+
+renderer = get_streaming_renderer()
+warm = sample_invoice()
+renderer.render(warm)  # compile the skeleton before measuring
+invoice = sample_invoice()
+baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+started = time.perf_counter()
+if {mode!r} == 'stream':
+    with open({output!r}, 'wb') as f:
+        renderer.render_items(invoice, read_items({items_path!r}), f, tax_rate=11)
+    size = os.path.getsize({output!r})
+else:
+    invoice.items = list(read_items({items_path!r}))
+    invoice.financials = compute_financials(sum(item['total'] for item in invoice.items), 11)
+    size = len(renderer.render(invoice).getvalue())
+elapsed = time.perf_counter() - started
+peak = tracemalloc.get_traced_memory()[1]
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "peak_mb": peak / 2 ** 20, "rss_growth_mb": (rss - baseline_rss) / 1024,
+                  "docx_bytes": size}}))
+'''
+
+
+def sample_invoice():
+    from invoice_engine.model import InvoiceData
+
+    invoice = InvoiceData()
+    invoice.invoice_number = "INV2025001"
+    invoice.client_info = {'{{client_name}}': 'PT Contoh Klien', '{{client_phone}}': '+62 812 0000 0000',
+                           '{{client_email}}': 'billing@example.com', '{{client_address}}': 'Jl. Sudirman No. 1'}
+    invoice.invoice_details = {'{{invoice_number}}': invoice.invoice_number, '{{invoice_date}}': '21.04.2025',
+                               '{{due_date}}': '28.04.2025'}
+    return invoice
+
+
+def write_items_csv(path, count):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['description', 'unit_price', 'quantity'])
+        for i in range(count):
+            writer.writerow([f'API usage, meter {i % 97}, period {i}', 1250 + i % 1000, 1 + i % 7])
+
+
+def probe(mode, items_path, output):
+    code = _PROBE.format(root=ROOT, mode=mode, items_path=items_path, output=output)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure peak memory of streamed large-invoice rendering.")
+    parser.add_argument('--items', type=int, nargs='+', default=DEFAULT_ITEM_COUNTS, help="Item counts to render")
+    parser.add_argument('--no-list', action='store_true', help="Skip the in-memory item list comparison")
+    parser.add_argument('--check', action='store_true', help="Fail when the streamed peak grows with the items")
+    parser.add_argument('-o', '--output', help="Write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='large-invoice-')
+    print(f"{'mode':<8} {'items':>8} {'seconds':>9} {'peak MB':>9} {'RSS +MB':>9} {'docx KB':>9}")
+    try:
+        for count in sorted(args.items):
+            items_path = os.path.join(workdir, f'items-{count}.csv')
+            write_items_csv(items_path, count)
+            for mode in ('stream',) if args.no_list else ('stream', 'list'):
+                result = probe(mode, items_path, os.path.join(workdir, 'invoice.docx'))
+                result.update(mode=mode, items=count)
+                results.append(result)
+                print(f"{mode:<8} {count:>8} {result['seconds']:>9.2f} {result['peak_mb']:>9.1f} "
+                      f"{result['rss_growth_mb']:>9.1f} {result['docx_bytes'] / 1024:>9.0f}")
+            os.remove(items_path)
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+    streamed = [result for result in results if result['mode'] == 'stream']
+    growth = streamed[-1]['peak_mb'] - streamed[0]['peak_mb']
+    print(f"streamed peak growth {streamed[0]['items']} -> {streamed[-1]['items']} items: {growth:+.1f} MB")
+    return 1 if args.check and growth > CHECK_SLACK_MB else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
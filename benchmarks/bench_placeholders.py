@@ -0,0 +1,57 @@
+# Compare the single-pass placeholder engine with the original per-key loop
+# on the shipped template. Run from the repository root:
+#   python benchmarks/bench_placeholders.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_engine import load_template
+from invoice_engine.placeholders import replace_placeholders
+
+REPLACEMENTS = {
+    '{{client_name}}': 'PT Contoh Klien',
+    '{{client_phone}}': '+62 812 0000 0000',
+    '{{client_email}}': 'billing@example.com',
+    '{{client_address}}': 'Jl. Sudirman No. 1, Jakarta',
+    '{{invoice_number}}': 'INV2025001',
+    '{{invoice_date}}': '21.04.2025',
+    '{{due_date}}': '28.04.2025',
+    '[subtotal]': 'Rp 1,500,000',
+    '[tax]': 'Rp 165,000',
+    '[discount]': '',
+    '[latefee]': '',
+    '[grandtotal]': 'Rp 1,665,000',
+    '{{LATE FEE:}}': '',
+}
+
+
+def legacy_replace_placeholders(doc, replacements):
+    # The implementation replace_placeholders had before the single-pass engine
+    for paragraph in doc.paragraphs:
+        for key, value in replacements.items():
+            if key in paragraph.text:
+                paragraph.text = paragraph.text.replace(key, value)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for key, value in replacements.items():
+                    if key in cell.text:
+                        cell.text = cell.text.replace(key, value)
+    return doc
+
+
+def main(number=200):
+    template = load_template()
+    docs = [template.new_document() for _ in range(number)]
+    legacy = timeit.timeit(lambda: legacy_replace_placeholders(docs.pop(), REPLACEMENTS), number=number)
+    docs = [template.new_document() for _ in range(number)]
+    engine = timeit.timeit(lambda: replace_placeholders(docs.pop(), REPLACEMENTS), number=number)
+    print(f"legacy replace_placeholders: {legacy / number * 1000:.3f} ms/doc")
+    print(f"single-pass engine:          {engine / number * 1000:.3f} ms/doc")
+    print(f"speedup:                     {legacy / engine:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Re-download cost with the rendered-artifact cache: a miss renders and saves
+# the DOCX, a hit reads it back from disk. Run from the repository root:
+#   python benchmarks/bench_render_cache.py
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_engine import load_template
+from invoice_engine.document import InvoiceData, build_invoice_document
+from invoice_engine.render_cache import ArtifactCache, artifact_key
+
+ROUNDS = 50
+
+
+def sample_invoice(number, items=20):
+    invoice = InvoiceData()
+    invoice.invoice_number = f"INV2025{number:03d}"
+    invoice.client_info = {'{{client_name}}': 'PT Contoh Klien', '{{client_phone}}': '+62 812 0000 0000',
+                           '{{client_email}}': 'billing@example.com', '{{client_address}}': 'Jl. Sudirman No. 1'}
+    invoice.invoice_details = {'{{invoice_number}}': invoice.invoice_number, '{{invoice_date}}': '21.04.2025',
+                               '{{due_date}}': '28.04.2025'}
+    invoice.items = [{'description': f'Item {i}', 'unit_price': 150000, 'quantity': 2, 'total': 300000}
+                     for i in range(items)]
+    invoice.financials = {'[subtotal]': 'Rp 6,000,000', '[tax]': 'Rp 660,000', '[discount]': '',
+                          '[latefee]': '', '[grandtotal]': 'Rp 6,660,000'}
+    return invoice
+
+
+def render(invoice):
+    output = io.BytesIO()
+    build_invoice_document(invoice).save(output)
+    return output.getvalue()
+
+
+def main():
+    template = load_template()
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ArtifactCache(tmp)
+        invoices = [sample_invoice(n) for n in range(ROUNDS)]
+
+        started = time.perf_counter()
+        for invoice in invoices:
+            cache.get_or_render(artifact_key(invoice, template), 'docx', lambda: render(invoice))
+        miss = (time.perf_counter() - started) * 1000 / ROUNDS
+
+        # A fresh instance, as after a restart: entries are found on disk
+        cache = ArtifactCache(tmp)
+        started = time.perf_counter()
+        for invoice in invoices:
+            cache.get_or_render(artifact_key(invoice, template), 'docx', lambda: render(invoice))
+        hit = (time.perf_counter() - started) * 1000 / ROUNDS
+    print(f"miss (render + store): {miss:.3f} ms/invoice")
+    print(f"hit (key + read):      {hit:.3f} ms/invoice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Import time of the engine modules in a fresh interpreter, and which heavy
+# or UI packages each one drags in. Run from the repository root:
+#   python benchmarks/bench_startup.py [-o startup.json] [--check] [--budget-ms 2000]
+# --check exits non-zero when a module imports a UI package, or a heavy one
+# it should only load on first use, or when the median cold `import app`
+# takes longer than the budget. tests/test_startup.py runs the same checks.
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'invoice_engine',
+    'invoice_engine.model',
+    'invoice_engine.pdf',
+    'invoice_engine.store',
+    'invoice_engine.numbering',
+    'invoice_engine.batch',
+    'invoice_engine.metrics',
+    'invoice_engine.document',
+    'invoice_engine.ooxml',
+]
+WATCHED = ['tkinter', 'tkcalendar', 'streamlit', 'pypandoc', 'PIL', 'requests', 'docx', 'lxml', 'http.server']
+# Never acceptable anywhere in the engine
+UI_PACKAGES = {'tkinter', 'tkcalendar', 'streamlit'}
+# Loaded on first use only; no engine import should pull these in
+LAZY_PACKAGES = {'pypandoc', 'PIL', 'requests', 'http.server'}
+# Modules that must not need python-docx just to be imported
+DOCX_FREE = {'invoice_engine', 'invoice_engine.model', 'invoice_engine.pdf', 'invoice_engine.store',
+             'invoice_engine.numbering', 'invoice_engine.batch', 'invoice_engine.metrics'}
+# Median cold `import app`, which runs the whole Streamlit script once in bare mode
+APP_BUDGET_MS = 2000
+
+_PROBE = '''
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+watched = {watched!r}
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [name for name in watched if name in sys.modules]}}))
+'''
+
+
+def probe(module, runs, cwd=ROOT, env=None):
+    code = _PROBE.format(module=module, watched=WATCHED)
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True,
+                                check=True)
+        result = json.loads(output.stdout.splitlines()[-1])
+        timings.append(result['ms'])
+        loaded = result['loaded']
+    return {'module': module, 'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3), 'runs': runs, 'loaded': loaded}
+
+
+def probe_app(runs, scratch):
+    # The database, caches and metrics port of a real start stay out of the checkout
+    env = dict(os.environ, PYTHONPATH=ROOT, INVOICE_METRICS_PORT='0', INVOICE_DB=os.path.join(scratch, 'invoices.db'),
+               INVOICE_ASSET_CACHE=os.path.join(scratch, '.asset_cache'),
+               INVOICE_RENDER_CACHE=os.path.join(scratch, '.render_cache'))
+    return probe('app', runs, cwd=scratch, env=env)
+
+
+def problems(result):
+    loaded = set(result['loaded'])
+    found = sorted(loaded & (UI_PACKAGES | LAZY_PACKAGES))
+    if result['module'] in DOCX_FREE and 'docx' in loaded:
+        found.append('docx')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure engine import time in fresh interpreters.")
+    parser.add_argument('-o', '--output', help="Write the JSON results to this file")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument('--check', action='store_true',
+                        help="Fail when a module loads a package it should not, or the app is over budget")
+    parser.add_argument('--budget-ms', type=float, default=APP_BUDGET_MS,
+                        help=f"Median cold `import app` allowed by --check (default {APP_BUDGET_MS})")
+    args = parser.parse_args(argv)
+
+    results = []
+    failed = False
+    print(f"{'module':<28} {'median ms':>10} {'min ms':>10}  loaded")
+    for module in MODULES:
+        result = probe(module, args.runs)
+        result['problems'] = problems(result)
+        failed = failed or bool(result['problems'])
+        results.append(result)
+        flag = f"  <- unexpected: {', '.join(result['problems'])}" if result['problems'] else ''
+        print(f"{module:<28} {result['median_ms']:>10.1f} {result['min_ms']:>10.1f}  "
+              f"{', '.join(result['loaded']) or '-'}{flag}")
+
+    app = None
+    if importlib.util.find_spec('streamlit') is None:
+        print(f"{'app':<28} skipped, streamlit is not installed")
+    else:
+        with tempfile.TemporaryDirectory(prefix='bench-startup-') as scratch:
+            app = probe_app(args.runs, scratch)
+        over = app['median_ms'] > args.budget_ms
+        failed = failed or over
+        flag = f"  <- over the {args.budget_ms:.0f} ms budget" if over else ''
+        print(f"{'app':<28} {app['median_ms']:>10.1f} {app['min_ms']:>10.1f}  {', '.join(app['loaded']) or '-'}{flag}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results, 'app': app,
+                       'app_budget_ms': args.budget_ms}, f, indent=2)
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Cost of saving one invoice as the history grows (the original whole-file
+# invoices.json rewrite against the SQLite store) and of listing one page of
+# unpaid invoices against loading every record. Run from the repository root:
+#   python benchmarks/bench_store.py [history sizes...]
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_engine.document import InvoiceData
+from invoice_engine.store import InvoiceStore
+
+DEFAULT_SIZES = [100, 1000, 10000]
+SAVES = 50
+
+
+def sample_invoice(number):
+    invoice = InvoiceData()
+    invoice.invoice_number = f"INV2025{number:05d}"
+    invoice.client_info = {'{{client_name}}': f'Client {number}', '{{client_phone}}': '+62 812 0000 0000',
+                           '{{client_email}}': 'billing@example.com', '{{client_address}}': 'Jl. Sudirman No. 1'}
+    invoice.invoice_details = {'{{invoice_date}}': '21.04.2025', '{{due_date}}': '28.04.2025'}
+    invoice.items = [{'description': f'Item {i}', 'unit_price': 150000, 'quantity': 2, 'total': 300000}
+                     for i in range(5)]
+    invoice.financials = {'[subtotal]': 'Rp 1,500,000', '[tax]': 'Rp 165,000', '[discount]': '',
+                          '[latefee]': '', '[grandtotal]': 'Rp 1,665,000'}
+    return invoice
+
+
+def legacy_save_invoice_data(invoice_db, invoice_data):
+    # The implementation app.py had before the store
+    if os.path.exists(invoice_db):
+        with open(invoice_db, 'r') as f:
+            invoices = json.load(f)
+    else:
+        invoices = {}
+
+    invoices[invoice_data.invoice_number] = invoice_data.to_dict()
+    with open(invoice_db, 'w') as f:
+        json.dump(invoices, f, indent=4)
+
+
+def main(sizes):
+    print(f"{'history':>8} {'json ms/save':>13} {'sqlite ms/save':>15} {'import ms':>10} {'load_all ms':>12} "
+          f"{'page ms':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'invoices.json')
+            with open(json_path, 'w') as f:
+                json.dump({sample_invoice(n).invoice_number: sample_invoice(n).to_dict() for n in range(size)}, f, indent=4)
+
+            started = time.perf_counter()
+            store = InvoiceStore(os.path.join(tmp, 'invoices.db'), legacy_json=json_path)
+            import_ms = (time.perf_counter() - started) * 1000
+
+            new = [sample_invoice(size + n) for n in range(SAVES)]
+            started = time.perf_counter()
+            for invoice in new:
+                legacy_save_invoice_data(json_path, invoice)
+            legacy = (time.perf_counter() - started) * 1000 / SAVES
+
+            started = time.perf_counter()
+            for invoice in new:
+                store.put(invoice)
+            sqlite = (time.perf_counter() - started) * 1000 / SAVES
+
+            started = time.perf_counter()
+            store.load_all()
+            load_all = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            store.query(paid=False, client='Client 1', limit=25)
+            page = (time.perf_counter() - started) * 1000
+            store.close()
+        print(f"{size:>8} {legacy:>13.3f} {sqlite:>15.3f} {import_ms:>10.1f} {load_all:>12.1f} {page:>8.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
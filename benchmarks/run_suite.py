@@ -0,0 +1,277 @@
+# Benchmark suite for the invoice rendering pipeline, stage by stage, over a
+# sweep of item counts. Results are JSON so two commits can be compared.
+# Run from the repository root:
+#   python benchmarks/run_suite.py -o before.json
+#   ... change something ...
+#   python benchmarks/run_suite.py -o after.json
+#   python benchmarks/run_suite.py --compare before.json after.json
+#
+# The stamp/signature step reads generated local images instead of the
+# network. PDF conversion is recorded as skipped when pandoc is missing.
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+from invoice_engine import assets
+from invoice_engine.document import (InvoiceData, build_invoice_document, build_replacements, format_currency,
+                                     style_financial_table, update_items_table)
+from invoice_engine.ooxml import StreamingRenderer
+from invoice_engine.pdf import convert_docx_file
+from invoice_engine.placeholders import replace_placeholders
+from invoice_engine.reproducible import save_docx
+from invoice_engine.stamp import add_paid_stamp_and_signature
+from invoice_engine.template import DEFAULT_TEMPLATE_PATH, CompiledTemplate, load_template
+
+DEFAULT_ITEM_COUNTS = [1, 50, 500, 5000]
+MIN_RUNS = 3
+MAX_RUNS = 20
+MIN_SECONDS = 0.5
+
+# Per-run scratch space; run_suite() creates and removes it
+_scratch_dir = None
+
+
+# === FIXTURES ===
+def sample_invoice(items, paid=True, late=True):
+    invoice = InvoiceData()
+    invoice.invoice_number = "INV2025001"
+    invoice.client_info = {'{{client_name}}': 'PT Contoh Klien', '{{client_phone}}': '+62 812 0000 0000',
+                           '{{client_email}}': 'billing@example.com', '{{client_address}}': 'Jl. Sudirman No. 1, Jakarta'}
+    invoice.invoice_details = {'{{invoice_number}}': invoice.invoice_number, '{{invoice_date}}': '21.04.2025',
+                               '{{due_date}}': '28.04.2025'}
+    invoice.items = [{'description': f'Consulting services, phase {i + 1}', 'unit_price': 150000 + i,
+                      'quantity': 2, 'total': 2 * (150000 + i)} for i in range(items)]
+    subtotal = sum(item['total'] for item in invoice.items)
+    invoice.financials = {'[subtotal]': format_currency(subtotal), '[tax]': format_currency(subtotal * 0.11),
+                          '[discount]': '', '[latefee]': format_currency(subtotal * 0.02 if late else 0),
+                          '[grandtotal]': format_currency(subtotal * 1.13)}
+    invoice.apply_late_fee = late
+    invoice.mark_as_paid = paid
+    return invoice
+
+
+def install_local_assets(directory):
+    # Offline asset cache over generated images, so the stamp step never touches the network
+    for url, name in assets.BUNDLED_FILES.items():
+        size = (400, 400) if url == assets.PAID_STAMP_URL else (300, 120)
+        Image.new('RGBA', size, (200, 30, 30, 160)).save(os.path.join(directory, name), format='PNG')
+    assets._cache = assets.AssetCache(cache_dir=directory, offline=True, bundled_dir=directory)
+
+
+def pandoc_available():
+    try:
+        import pypandoc
+
+        pypandoc.get_pandoc_path()
+        return True
+    except Exception:
+        return False
+
+
+# === STAGES ===
+# Each stage takes the item count and does its setup, untimed, returning the
+# callable that is timed. Stages with sweep=False do not depend on the items.
+def stage_template_parse(count):
+    return lambda: CompiledTemplate(DEFAULT_TEMPLATE_PATH)
+
+
+def stage_template_new_document(count):
+    template = load_template()
+    return template.new_document
+
+
+def stage_replace_placeholders(count):
+    doc = load_template().new_document()
+    replacements = build_replacements(sample_invoice(1))
+    return lambda: replace_placeholders(doc, replacements)
+
+
+def stage_update_items_table(count):
+    doc = load_template().new_document()
+    items = sample_invoice(count).items
+    return lambda: update_items_table(doc, items)
+
+
+def stage_style_financial_table(count):
+    doc = load_template().new_document()
+    invoice = sample_invoice(1)
+    return lambda: style_financial_table(doc, invoice)
+
+
+def stage_paid_stamp(count):
+    doc = load_template().new_document()
+    return lambda: add_paid_stamp_and_signature(doc)
+
+
+def stage_build_invoice_document(count):
+    invoice = sample_invoice(count)
+    return lambda: build_invoice_document(invoice)
+
+
+def stage_serialize_docx(count):
+    template = load_template()
+    doc = build_invoice_document(sample_invoice(count), template)
+    return lambda: save_docx(doc, io.BytesIO(), template=template)
+
+
+def stage_streaming_render(count):
+    renderer = StreamingRenderer()
+    invoice = sample_invoice(count)
+    renderer.render(invoice)  # compiles the skeleton for this paid/late combination
+    return lambda: renderer.render(invoice)
+
+
+def stage_pdf_conversion(count):
+    workdir = tempfile.mkdtemp(prefix='pdf-', dir=_scratch_dir)
+    docx_path = os.path.join(workdir, 'invoice.docx')
+    with open(docx_path, 'wb') as f:
+        StreamingRenderer().render(sample_invoice(count), f)
+    return lambda: convert_docx_file(docx_path, os.path.join(workdir, 'invoice.pdf'))
+
+
+# (name, function, sweep)
+STAGES = [
+    ('template_parse', stage_template_parse, False),
+    ('template_new_document', stage_template_new_document, False),
+    ('replace_placeholders', stage_replace_placeholders, False),
+    ('update_items_table', stage_update_items_table, True),
+    ('style_financial_table', stage_style_financial_table, False),
+    ('paid_stamp', stage_paid_stamp, False),
+    ('build_invoice_document', stage_build_invoice_document, True),
+    ('serialize_docx', stage_serialize_docx, True),
+    ('streaming_render', stage_streaming_render, True),
+    ('pdf_conversion', stage_pdf_conversion, True),
+]
+
+
+# === RUNNER ===
+def measure(stage, count, min_runs=MIN_RUNS, max_runs=MAX_RUNS, min_seconds=MIN_SECONDS):
+    timings = []
+    while len(timings) < max_runs and (len(timings) < min_runs or sum(timings) < min_seconds):
+        run = stage(count)
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    timings_ms = [t * 1000 for t in timings]
+    return {
+        'runs': len(timings_ms),
+        'min_ms': round(min(timings_ms), 4),
+        'median_ms': round(statistics.median(timings_ms), 4),
+        'mean_ms': round(statistics.mean(timings_ms), 4),
+        'max_ms': round(max(timings_ms), 4),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import docx
+    import lxml.etree
+
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python_docx': getattr(docx, '__version__', None),
+        'lxml': '.'.join(str(part) for part in lxml.etree.LXML_VERSION),
+    }
+
+
+def run_suite(item_counts, stages=None, pdf_max_items=500, progress=None):
+    selected = [stage for stage in STAGES if stages is None or stage[0] in stages]
+    have_pandoc = pandoc_available()
+    results = []
+    global _scratch_dir
+    _scratch_dir = tempfile.mkdtemp(prefix='invoice-bench-')
+    saved_cache = assets._cache
+    install_local_assets(_scratch_dir)
+    try:
+        for name, stage, sweep in selected:
+            for count in (item_counts if sweep else [None]):
+                result = {'stage': name, 'items': count}
+                if name == 'pdf_conversion' and not have_pandoc:
+                    result['skipped'] = 'pandoc not available'
+                elif name == 'pdf_conversion' and count > pdf_max_items:
+                    result['skipped'] = f'more than {pdf_max_items} items'
+                else:
+                    result.update(measure(stage, count or 0))
+                results.append(result)
+                if progress:
+                    progress(result)
+    finally:
+        assets._cache = saved_cache
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+        _scratch_dir = None
+    return {'environment': environment(), 'results': results}
+
+
+def format_result(result):
+    items = '-' if result['items'] is None else result['items']
+    if 'skipped' in result:
+        return f"{result['stage']:<24} {items:>6}  skipped: {result['skipped']}"
+    return (f"{result['stage']:<24} {items:>6} {result['median_ms']:>12.3f} {result['min_ms']:>12.3f} "
+            f"{result['runs']:>5}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    baseline = {(r['stage'], r['items']): r for r in before['results'] if 'skipped' not in r}
+    print(f"before: {before['environment'].get('commit')}  after: {after['environment'].get('commit')}")
+    print(f"{'stage':<24} {'items':>6} {'before ms':>12} {'after ms':>12} {'change':>8}")
+    for result in after['results']:
+        old = baseline.get((result['stage'], result['items']))
+        if old is None or 'skipped' in result:
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100
+        items = '-' if result['items'] is None else result['items']
+        print(f"{result['stage']:<24} {items:>6} {old['median_ms']:>12.3f} {result['median_ms']:>12.3f} "
+              f"{change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the invoice rendering pipeline.")
+    parser.add_argument('-o', '--output', help="Write the JSON results to this file")
+    parser.add_argument('--items', type=int, nargs='+', default=DEFAULT_ITEM_COUNTS, help="Item counts to sweep")
+    parser.add_argument('--stage', action='append', choices=[name for name, _, _ in STAGES],
+                        help="Only run this stage (repeatable)")
+    parser.add_argument('--pdf-max-items', type=int, default=500, help="Largest item count converted to PDF")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    os.chdir(ROOT)
+    print(f"{'stage':<24} {'items':>6} {'median ms':>12} {'min ms':>12} {'runs':>5}")
+    report = run_suite(args.items, args.stage, args.pdf_max_items, progress=lambda r: print(format_result(r)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
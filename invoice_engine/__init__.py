@@ -0,0 +1,22 @@
+# Shared, UI-free invoice rendering code used by app.py and marketixlab_invoice.py
+# Names are resolved on first use so importing a submodule (pdf, store, ...) stays cheap
+_EXPORTS = {
+    'CompiledTemplate': 'template',
+    'load_template': 'template',
+    'DEFAULT_TEMPLATE_PATH': 'template',
+    'TemplateError': 'template',
+    'TemplateRegistry': 'template',
+    'get_template': 'template',
+    'get_template_registry': 'template',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(f'.{module}', __name__), name)
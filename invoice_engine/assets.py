@@ -0,0 +1,274 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+
+# Direct download URLs for the stamp and signature images
+PAID_STAMP_URL = "https://drive.google.com/uc?export=download&id=1W9PL0DtP0TUk7IcGiMD_ZuLddtQ8gjNo"
+SIGNATURE_URL = "https://drive.google.com/uc?export=download&id=1b6Dcg4spQmvLUMd4neBtLNfdr5l7QtPJ"
+
+# Copies for offline use, by URL. Not part of the repository: written by
+# `python -m invoice_engine.assets --bundle` on a machine that can reach Drive
+BUNDLED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+BUNDLED_FILES = {
+    PAID_STAMP_URL: 'paid_stamp.png',
+    SIGNATURE_URL: 'signature.png',
+}
+ASSET_CACHE_DIR = os.environ.get("INVOICE_ASSET_CACHE", ".asset_cache")
+OFFLINE = os.environ.get("INVOICE_OFFLINE", "").lower() in ('1', 'true', 'yes')
+# Seconds to wait on Drive for a connection or for the next chunk of a download
+FETCH_TIMEOUT = float(os.environ.get("INVOICE_ASSET_TIMEOUT", "15"))
+
+logger = logging.getLogger("invoice_engine.assets")
+
+_OFFLINE_SETUP = ("Run `python -m invoice_engine.assets --bundle` on a machine that can reach Google Drive "
+                  "and ship the invoice_engine/assets/ directory it writes, or unset INVOICE_OFFLINE.")
+
+# Formats python-docx can embed directly; anything else is converted once on insert
+_DOCX_IMAGE_FORMATS = {'PNG', 'JPEG', 'GIF', 'BMP', 'TIFF'}
+
+def fetch_image(url, timeout=FETCH_TIMEOUT):
+    import requests
+    from PIL import Image
+
+    try:
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        session = requests.Session()
+        response = session.get(url, headers=headers, stream=True, allow_redirects=True, timeout=timeout)
+        
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch image from {url}. Status code: {response.status_code}")
+
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('image/'):
+            response_text = response.text
+            if "google.com" in response_text and "confirm=" in response_text:
+                confirm_match = re.search(r'confirm=([a-zA-Z0-9\-_]+)', response_text)
+                if confirm_match:
+                    confirm_token = confirm_match.group(1)
+                    confirm_url = f"{url}&confirm={confirm_token}"
+                    response = session.get(confirm_url, headers=headers, stream=True, allow_redirects=True,
+                                           timeout=timeout)
+                    content_type = response.headers.get('Content-Type', '')
+                    if not content_type.startswith('image/'):
+                        response_content = response.text[:200]
+                        raise Exception(
+                            f"URL {url} still did not return an image after confirmation. "
+                            f"Content-Type: {content_type}. "
+                            f"Response preview: {response_content}"
+                        )
+                else:
+                    response_content = response_text[:200]
+                    raise Exception(
+                        f"URL {url} returned a confirmation page, but no confirmation token found. "
+                        f"Content-Type: {content_type}. "
+                        f"Response preview: {response_content}"
+                    )
+            else:
+                response_content = response_text[:200]
+                raise Exception(
+                    f"URL {url} did not return an image. "
+                    f"Content-Type: {content_type}. "
+                    f"Response preview: {response_content}"
+                )
+
+        image_data = io.BytesIO(response.content)
+        img = Image.open(image_data)
+        img.verify()
+        image_data.seek(0)
+        
+        return image_data
+
+    except Exception as e:
+        raise Exception(f"Error fetching image from {url}: {str(e)}")
+
+
+def _validated_image(data):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.verify()
+    if img.format in _DOCX_IMAGE_FORMATS:
+        return data
+    converted = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(converted, format="PNG")
+    return converted.getvalue()
+
+
+class OfflineAssetsError(Exception):
+    pass
+
+
+class AssetCache:
+    """Images by URL, held in memory and on disk under their SHA-256.
+
+    Lookups go memory -> disk -> network, with the bundled copy used in
+    offline mode or when the download fails. Disk copies are checked against
+    their hash when loaded; downloads are verified with PIL once, on insert.
+    Bundled copies only exist once --bundle has written them, so offline mode
+    refuses to start without a local copy of every image.
+    """
+
+    def __init__(self, cache_dir=ASSET_CACHE_DIR, offline=OFFLINE, bundled_dir=BUNDLED_DIR):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.bundled_dir = bundled_dir
+        self._memory = {}
+        # Guards the per-URL locks and the disk index; never held during a download
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        if offline:
+            missing = [name for url, name in BUNDLED_FILES.items()
+                       if self._load_disk(url) is None
+                       and not os.path.exists(os.path.join(bundled_dir, name))]
+            if missing:
+                raise OfflineAssetsError(f"INVOICE_OFFLINE is set but there is no local copy of {', '.join(missing)} "
+                                         f"(looked in {bundled_dir} and {cache_dir}). {_OFFLINE_SETUP}")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_atomic(self, path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+
+    def _load_disk(self, url):
+        digest = self._read_index().get(url)
+        if not digest:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return None
+        return data
+
+    def _store_disk(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = os.path.join(self.cache_dir, digest)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, data)
+        with self._lock:
+            index = self._read_index()
+            index[url] = digest
+            self._write_atomic(self._index_path, json.dumps(index, indent=4).encode('utf-8'))
+
+    def _load_bundled(self, url):
+        name = BUNDLED_FILES.get(url)
+        if name is None:
+            return None
+        path = os.path.join(self.bundled_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return _validated_image(f.read())
+
+    def get(self, url):
+        data = self._memory.get(url)
+        if data is not None:
+            return data
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        # One download per URL at a time; a slow one never holds up other URLs
+        with url_lock:
+            data = self._memory.get(url)
+            if data is None:
+                data = self._load_disk(url)
+            if data is None and not self.offline:
+                try:
+                    data = _validated_image(fetch_image(url).getvalue())
+                except Exception:
+                    data = self._load_bundled(url)
+                    if data is None:
+                        raise
+                else:
+                    try:
+                        self._store_disk(url, data)
+                    except OSError as e:
+                        # Read-only or full disk: still serve the download, from memory
+                        logger.warning("could not cache %s in %s: %s", url, self.cache_dir, e)
+            if data is None:
+                data = self._load_bundled(url)
+            if data is None and self.offline:
+                raise OfflineAssetsError(f"Image {url} is not cached and no bundled copy exists in "
+                                         f"{self.bundled_dir}. {_OFFLINE_SETUP}")
+            if data is None:
+                raise Exception(f"Image {url} is not cached and no bundled copy exists in {self.bundled_dir}")
+            self._memory[url] = data
+            return data
+
+    def prefetch(self, urls=None):
+        failures = {}
+        for url in urls or BUNDLED_FILES:
+            try:
+                self.get(url)
+            except Exception as e:
+                failures[url] = str(e)
+        return failures
+
+    def export_bundled(self):
+        # Refresh the shipped copies from the cache so offline mode has them
+        os.makedirs(self.bundled_dir, exist_ok=True)
+        for url, name in BUNDLED_FILES.items():
+            with open(os.path.join(self.bundled_dir, name), 'wb') as f:
+                f.write(self.get(url))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_prefetch_started = False
+
+
+def get_asset_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AssetCache()
+        return _cache
+
+
+def get_asset(url):
+    return get_asset_cache().get(url)
+
+
+def start_prefetch():
+    # Warm the stamp and signature in the background once per process
+    global _prefetch_started
+    with _cache_lock:
+        if _prefetch_started:
+            return
+        _prefetch_started = True
+    threading.Thread(target=get_asset_cache().prefetch, name="asset-prefetch", daemon=True).start()
+
+
+if __name__ == "__main__":
+    # python -m invoice_engine.assets [--bundle]
+    cache = get_asset_cache()
+    failed = cache.prefetch()
+    for url, error in failed.items():
+        print(f"failed: {url}: {error}")
+    if not failed and '--bundle' in sys.argv[1:]:
+        cache.export_bundled()
+        print(f"bundled copies written to {cache.bundled_dir}")
+    sys.exit(1 if failed else 0)
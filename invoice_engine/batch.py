@@ -0,0 +1,214 @@
+# Headless batch invoice generation:
+#   python -m invoice_engine.batch invoices.jsonl -o out/ --workers 8
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+from .model import InvoiceData, invoice_filenames
+from .pdf import DEFAULT_TIMEOUT, convert_docx_file
+from .reproducible import file_hash
+from .render_pool import DEFAULT_MAX_TASKS_PER_WORKER, DEFAULT_MAX_WORKER_MB, DEFAULT_RETRIES, RenderPool
+from .template import DEFAULT_TEMPLATE
+
+# CSV columns holding JSON-encoded values; the rest of InvoiceData.to_dict() is scalar
+_JSON_COLUMNS = ('client_info', 'invoice_details', 'items', 'financials')
+_BOOL_COLUMNS = ('apply_late_fee', 'mark_as_paid')
+# mkstemp creates files 0600; published documents get the usual 0644
+_OUTPUT_MODE = 0o644
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def _record_from_csv_row(row):
+    record = dict(row)
+    for column in _JSON_COLUMNS:
+        if record.get(column):
+            record[column] = json.loads(record[column])
+    for column in _BOOL_COLUMNS:
+        if column in record:
+            record[column] = _parse_bool(record[column])
+    return record
+
+
+def read_records(path, input_format=None):
+    """Yield invoice records (InvoiceData.to_dict() shape) from a CSV or JSONL file."""
+    if input_format is None:
+        input_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    with open(path, newline='', encoding='utf-8') as f:
+        if input_format == 'csv':
+            for row in csv.DictReader(f):
+                yield _record_from_csv_row(row)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _is_current(pdf_path, docx_path):
+    try:
+        return os.path.getmtime(pdf_path) >= os.path.getmtime(docx_path)
+    except OSError:
+        return False
+
+
+def read_items(path, input_format=None):
+    """Yield line items one at a time from a CSV (description,unit_price,quantity[,total]) or JSONL file.
+
+    Meant for StreamingRenderer.render_items: nothing is held beyond the current row.
+    """
+    if input_format is None:
+        input_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.DictReader(f) if input_format == 'csv' else (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            unit_price = float(row['unit_price'])
+            quantity = float(row['quantity'])
+            total = row.get('total')
+            yield {'description': row['description'], 'unit_price': unit_price, 'quantity': quantity,
+                   'total': float(total) if total not in (None, '') else unit_price * quantity}
+
+
+def render_record(index, record, output_dir, template=DEFAULT_TEMPLATE, pdf=True, pdf_timeout=DEFAULT_TIMEOUT,
+                  skip_unchanged=False):
+    # Runs in a worker process; never raises so one bad record can't stop the batch.
+    # A record's own "template" wins over the batch-wide one. Output is
+    # deterministic, so with skip_unchanged a DOCX identical to the one
+    # already on disk is left alone and its existing PDF reused.
+    from .ooxml import get_streaming_renderer
+    from .template import get_template
+
+    started = time.perf_counter()
+    result = {'index': index, 'invoice_number': record.get('invoice_number', ''), 'status': 'ok'}
+    timings = result['timings'] = {}
+    try:
+        invoice_data = InvoiceData.from_dict(record)
+        docx_filename, pdf_filename = invoice_filenames(invoice_data)
+        docx_path = os.path.join(output_dir, docx_filename)
+
+        stage = time.perf_counter()
+        renderer = get_streaming_renderer(get_template(invoice_data.template or template))
+        previous = file_hash(docx_path) if skip_unchanged and os.path.exists(docx_path) else None
+        # A unique temp name: two records can map to the same file name
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix='.tmp-', suffix='.docx')
+        try:
+            os.fchmod(fd, _OUTPUT_MODE)
+            with os.fdopen(fd, 'wb') as f:
+                renderer.render(invoice_data, f)
+            result['sha256'] = file_hash(tmp_path)
+            unchanged = result['sha256'] == previous
+            if unchanged:
+                os.remove(tmp_path)
+                result['unchanged'] = True
+            else:
+                os.replace(tmp_path, docx_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        timings['docx_ms'] = round((time.perf_counter() - stage) * 1000, 3)
+        result['docx'] = docx_path
+
+        if pdf and unchanged and _is_current(os.path.join(output_dir, pdf_filename), docx_path):
+            result['pdf'] = os.path.join(output_dir, pdf_filename)
+        elif pdf:
+            stage = time.perf_counter()
+            pdf_path = os.path.join(output_dir, pdf_filename)
+            convert_docx_file(docx_path, pdf_path, pdf_timeout)
+            timings['pdf_ms'] = round((time.perf_counter() - stage) * 1000, 3)
+            result['pdf'] = pdf_path
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    timings['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    result['worker_pid'] = os.getpid()
+    return result
+
+
+def assign_invoice_numbers(records, allocator=None):
+    """Give every record without an invoice number one from a single block reservation."""
+    missing = [record for record in records if not record.get('invoice_number')]
+    if not missing:
+        return 0
+    from .numbering import get_allocator
+
+    if allocator is None:
+        allocator = get_allocator()
+    numbers = allocator.reserve_block(len(missing))
+    for record, invoice_number in zip(missing, numbers):
+        record['invoice_number'] = invoice_number
+        record.setdefault('invoice_details', {})['{{invoice_number}}'] = invoice_number
+    return len(missing)
+
+
+def run_batch(records, output_dir, workers=None, template=DEFAULT_TEMPLATE, pdf=True, manifest_path=None,
+              pdf_timeout=DEFAULT_TIMEOUT, ordered=False, max_tasks_per_worker=DEFAULT_MAX_TASKS_PER_WORKER,
+              max_worker_mb=DEFAULT_MAX_WORKER_MB, retries=DEFAULT_RETRIES, skip_unchanged=False):
+    """Render all records across a warmed-up worker pool, writing one manifest line per invoice."""
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+
+    summary = {'ok': 0, 'error': 0, 'unchanged': 0}
+    started = time.perf_counter()
+    pool = RenderPool(output_dir, workers=workers, template=template, pdf=pdf, pdf_timeout=pdf_timeout,
+                      max_tasks_per_worker=max_tasks_per_worker, max_worker_mb=max_worker_mb, retries=retries,
+                      skip_unchanged=skip_unchanged)
+    with open(manifest_path, 'w', encoding='utf-8') as manifest, pool:
+        for result in pool.imap(records, ordered=ordered):
+            summary[result['status']] += 1
+            summary['unchanged'] += bool(result.get('unchanged'))
+            manifest.write(json.dumps(result) + '\n')
+            manifest.flush()
+    summary.update(pool.counters)
+    summary['wall_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    summary['manifest'] = manifest_path
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate invoices in bulk from a CSV or JSONL file.")
+    parser.add_argument('input', help="CSV or JSONL file of invoice records")
+    parser.add_argument('-o', '--output-dir', default='invoices_out', help="Directory for the generated files")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help="Input format (default: from extension)")
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE,
+                        help="Template name, or a .docx path, for records that do not name one")
+    parser.add_argument('--manifest', default=None, help="Manifest path (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument('--no-pdf', action='store_true', help="Only produce DOCX files")
+    parser.add_argument('--pdf-timeout', type=float, default=DEFAULT_TIMEOUT, help="Seconds allowed per PDF conversion")
+    parser.add_argument('--ordered', action='store_true', help="Write the manifest in input order")
+    parser.add_argument('--max-tasks-per-worker', type=int, default=DEFAULT_MAX_TASKS_PER_WORKER,
+                        help="Replace a worker after this many invoices (0: never)")
+    parser.add_argument('--max-worker-mb', type=float, default=DEFAULT_MAX_WORKER_MB,
+                        help="Replace a worker once its unique set size (USS) exceeds this; Linux only (0: no cap)")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help="Times to retry an invoice whose worker died")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="Keep files whose DOCX is byte-identical to the one already written, and their PDFs")
+    parser.add_argument('--assign-numbers', action='store_true',
+                        help="Allocate invoice numbers for records that have none")
+    args = parser.parse_args(argv)
+
+    records = list(read_records(args.input, args.format))
+    if args.assign_numbers:
+        assign_invoice_numbers(records)
+    summary = run_batch(records, args.output_dir, workers=args.workers, template=args.template,
+                        pdf=not args.no_pdf, manifest_path=args.manifest, pdf_timeout=args.pdf_timeout,
+                        ordered=args.ordered, max_tasks_per_worker=args.max_tasks_per_worker,
+                        max_worker_mb=args.max_worker_mb, retries=args.retries, skip_unchanged=args.skip_unchanged)
+    print(f"{summary['ok']} generated ({summary['unchanged']} unchanged), {summary['error']} failed in {summary['wall_ms'] / 1000:.1f}s "
+          f"(manifest: {summary['manifest']})")
+    return 1 if summary['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import copy
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import RGBColor
+
+from .assets import PAID_STAMP_URL, SIGNATURE_URL, get_asset
+from .metrics import RenderMetrics, recording
+# InvoiceData and the formatting helpers moved to model.py; still importable from here
+from .model import InvoiceData, format_currency, format_quantity, invoice_filenames, sanitize_filename
+from .placeholders import replace_placeholders
+from .reproducible import save_docx
+from .stamp import add_paid_stamp_and_signature
+from .styles import apply_cell_style, set_tc_borders, set_white_borders
+from .template import template_for
+
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+_W_T = qn('w:t')
+_CELL_TEXT_PATH = './' + qn('w:tc') + '/' + qn('w:p') + '/' + qn('w:r') + '/' + qn('w:t')
+
+
+# === DOCUMENT STYLING FUNCTIONS ===
+# Courier New is the compiled template's document default (CompiledTemplate),
+# so runs created here inherit it instead of each carrying its own fonts.
+# Table and row positions default to the bundled template's; CompiledTemplate
+# finds them for any template (financial_table, late_fee_row, items_table, item_row).
+def style_financial_table(doc, invoice_data, table_index=1, late_fee_row=3):
+    financial_table = doc.tables[table_index]
+    for row in financial_table.rows:
+        for cell in row.cells:
+            set_white_borders(cell)
+        for paragraph in row.cells[1].paragraphs:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    if invoice_data.apply_late_fee:
+        late_fee_cell = financial_table.rows[late_fee_row].cells[0]
+        if late_fee_cell.text.strip():
+            original_text = late_fee_cell.text
+            late_fee_cell.text = ""
+            paragraph = late_fee_cell.paragraphs[0]
+            run = paragraph.add_run(original_text)
+            run.font.color.rgb = RGBColor.from_string('d95132')
+
+# === INVOICE GENERATION LOGIC ===
+ITEM_ALIGNMENTS = [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.RIGHT,
+                   WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]
+
+def item_row_prototype(items_table):
+    # A fully styled, empty item row, built the way add_row() + cell.text +
+    # apply_cell_style would build it. Not attached to the table.
+    row = items_table.add_row()
+    for i, cell in enumerate(row.cells):
+        cell.text = " "
+        apply_cell_style(cell)
+        for paragraph in cell.paragraphs:
+            paragraph.alignment = ITEM_ALIGNMENTS[i]
+    items_table._tbl.remove(row._tr)
+    return row._tr
+
+def _set_run_text(t, text):
+    if not text:
+        t.getparent().remove(t)
+    elif '\t' in text or '\n' in text or '\r' in text:
+        t.getparent().text = text
+    else:
+        t.text = text
+        if text[0].isspace() or text[-1].isspace():
+            t.set(_XML_SPACE, 'preserve')
+        else:
+            t.attrib.pop(_XML_SPACE, None)
+
+def build_item_rows(prototype, items):
+    # Clones the prototype once per item; no per-row cell grid lookups
+    for item in items:
+        tr = copy.deepcopy(prototype)
+        texts = tr.findall(_CELL_TEXT_PATH)
+        _set_run_text(texts[0], item['description'])
+        _set_run_text(texts[1], format_currency(item['unit_price']))
+        _set_run_text(texts[2], format_quantity(item['quantity']))
+        _set_run_text(texts[3], format_currency(item['total']))
+        yield tr
+
+def update_items_table(doc, items, table_index=0, first_item_row=1):
+    items_table = doc.tables[table_index]
+    tbl = items_table._tbl
+    for tr in tbl.tr_lst:
+        for tc in tr.tc_lst:
+            set_tc_borders(tc, sz=6)
+    prototype = item_row_prototype(items_table)
+    # The generated rows replace the placeholder row and the blank filler rows
+    # right after it, in one go. Rows with content after those (notes, totals
+    # in a branded template) stay where they are.
+    rows = tbl.tr_lst[first_item_row:]
+    replaced = 1
+    while replaced < len(rows) and not ''.join(rows[replaced].itertext(_W_T)).strip():
+        replaced += 1
+    position = tbl.index(rows[0])
+    tbl[position:position + replaced] = list(build_item_rows(prototype, items))
+    return doc
+
+def build_replacements(invoice_data):
+    replacements = {**invoice_data.client_info, **invoice_data.invoice_details, **invoice_data.financials}
+    if invoice_data.apply_late_fee:
+        replacements['{{LATE FEE:}}'] = 'LATE FEE'
+    else:
+        replacements['{{LATE FEE:}}'] = ''
+        replacements['[latefee]'] = ''
+    return replacements
+
+def build_invoice_document(invoice_data, template=None, replacements=None, metrics=None):
+    # metrics: a RenderMetrics that collects the stage timings; the caller finishes it
+    if metrics is None:
+        metrics = RenderMetrics('engine')
+    with metrics.stage('template'):
+        if template is None:
+            template = template_for(invoice_data)
+        doc = template.new_document()
+    if replacements is None:
+        replacements = build_replacements(invoice_data)
+    with metrics.stage('replace_placeholders'):
+        doc = replace_placeholders(doc, replacements)
+    with metrics.stage('items_table'):
+        doc = update_items_table(doc, invoice_data.items, template.items_table, template.item_row)
+    with metrics.stage('financial_table'):
+        style_financial_table(doc, invoice_data, template.financial_table, template.late_fee_row)
+
+    if invoice_data.mark_as_paid:
+        # Fetched ahead so paid_stamp times only the document work; same error as the stamp step
+        with metrics.stage('asset_fetch'):
+            try:
+                get_asset(PAID_STAMP_URL)
+                get_asset(SIGNATURE_URL)
+            except Exception as e:
+                raise Exception(f"Failed to add stamp and signature: {str(e)}")
+        with metrics.stage('paid_stamp'):
+            doc = add_paid_stamp_and_signature(doc)
+    return doc
+
+def render_docx(invoice_data, source="engine", template=None):
+    # Build and serialize one invoice, recording its metrics under `source`
+    with recording(source, invoice_data.invoice_number, len(invoice_data.items)) as metrics:
+        if template is None:
+            template = template_for(invoice_data)
+        doc = build_invoice_document(invoice_data, template, metrics=metrics)
+        with metrics.stage("serialize"):
+            docx_bytes = save_docx(doc, template=template)
+        metrics.size("docx", len(docx_bytes))
+    return docx_bytes
@@ -0,0 +1,118 @@
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOB_WORKERS = int(os.environ.get("INVOICE_RENDER_JOBS", "2"))
+DEFAULT_MAX_PENDING = int(os.environ.get("INVOICE_RENDER_MAX_PENDING", "50"))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class RenderJob:
+    def __init__(self, job_id, key, sequence):
+        self.id = job_id
+        self.key = key
+        self.sequence = sequence
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+
+class RenderJobQueue:
+    """Runs render work off the Streamlit script thread.
+
+    submit() returns a job id straight away; the UI polls get(job_id) on
+    later reruns, so a rerun never loses work in progress. At most
+    `workers` jobs run at once (each may hold a pandoc/LaTeX process) and
+    at most `max_pending` wait; beyond that submit() raises QueueFullError.
+    A job submitted under the key of one still pending is not run twice.
+    Finished jobs are kept for the last `history` submissions.
+    """
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, max_pending=DEFAULT_MAX_PENDING, history=500):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='render-job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending_by_key = {}
+        self._sequence = itertools.count()
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            job_id = self._pending_by_key.get(key)
+            if job_id is not None:
+                return job_id
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} invoices are already being rendered; try again shortly")
+            job = RenderJob(uuid.uuid4().hex, key, next(self._sequence))
+            self._jobs[job.id] = job
+            if key is not None:
+                self._pending_by_key[key] = job.id
+            self._trim()
+        self._executor.submit(self._run, job, fn, args)
+        return job.id
+
+    def _run(self, job, fn, args):
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            job.result = fn(*args)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = time.time()
+        with self._lock:
+            if self._pending_by_key.get(job.key) == job.id:
+                del self._pending_by_key[job.key]
+
+    def _trim(self):
+        # Oldest finished jobs go first; running ones are never dropped
+        excess = len(self._jobs) - self.history
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(0, excess)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """How many queued jobs are ahead of this one (0 once it is running)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            return sum(1 for other in self._jobs.values() if other.status == QUEUED and other.sequence < job.sequence)
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,273 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_HOST = os.environ.get("INVOICE_METRICS_HOST", "127.0.0.1")
+# Port for the Prometheus text endpoint; "0" or empty turns it off
+METRICS_PORT = os.environ.get("INVOICE_METRICS_PORT", "9464")
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = tuple(1024 * 4 ** n for n in range(10))  # 1 KiB .. 256 MiB
+ITEMS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+
+logger = logging.getLogger("invoice_engine.metrics")
+
+
+# === RENDER RECORD ===
+class RenderMetrics:
+    """Stage durations, sizes and counts for one render, handed to the hooks on finish().
+
+    `source` says who rendered ('web', 'desktop', 'pdf', ...). Stages are
+    timed with `with metrics.stage('name'):`; the same name used twice adds up.
+    """
+
+    def __init__(self, source, invoice_number=None, items=None):
+        self.source = source
+        self.invoice_number = invoice_number
+        self.items = items
+        self.stages = {}
+        self.sizes = {}
+        self.status = 'ok'
+        self.error = None
+        self._started = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def size(self, kind, nbytes):
+        self.sizes[kind] = nbytes
+
+    def fail(self, error):
+        self.status = 'error'
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self.total = time.perf_counter() - self._started
+        emit(self)
+
+    def to_dict(self):
+        return {
+            'event': 'invoice_render',
+            'source': self.source,
+            'invoice_number': self.invoice_number,
+            'status': self.status,
+            'error': self.error,
+            'items': self.items,
+            'total_ms': round(getattr(self, 'total', 0.0) * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            'bytes': dict(self.sizes),
+        }
+
+
+@contextmanager
+def recording(source, invoice_number=None, items=None):
+    # A RenderMetrics that is finished, and marked failed on an exception, on exit
+    metrics = RenderMetrics(source, invoice_number, items)
+    try:
+        yield metrics
+    except Exception as e:
+        metrics.fail(e)
+        raise
+    finally:
+        metrics.finish()
+
+
+# === HOOKS ===
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+def add_metrics_hook(hook):
+    """Call hook(metrics) with every finished RenderMetrics."""
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit(metrics):
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(metrics)
+        except Exception:
+            # Instrumentation must never break an invoice
+            logger.exception("metrics hook %r failed", hook)
+
+
+def log_hook(metrics):
+    # One JSON object per render, at INFO; configure logging to see it
+    logger.info(json.dumps(metrics.to_dict(), sort_keys=True))
+
+
+# === PROMETHEUS ===
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                cumulative += count
+                labels = _format_labels(key + (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class PrometheusRegistry:
+    """Aggregates finished renders into histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.renders = Counter('invoice_renders_total', "Invoice renders by source and status.")
+        self.render_seconds = Histogram('invoice_render_seconds', "Whole render duration.", SECONDS_BUCKETS)
+        self.stage_seconds = Histogram('invoice_render_stage_seconds', "Duration of each render stage.",
+                                       SECONDS_BUCKETS)
+        self.output_bytes = Histogram('invoice_output_bytes', "Size of rendered documents.", BYTES_BUCKETS)
+        self.items = Histogram('invoice_items', "Line items per rendered invoice.", ITEMS_BUCKETS)
+        self._metrics = [self.renders, self.render_seconds, self.stage_seconds, self.output_bytes, self.items]
+
+    def __call__(self, metrics):
+        with self._lock:
+            self.renders.inc(source=metrics.source, status=metrics.status)
+            self.render_seconds.observe(metrics.total, source=metrics.source)
+            for name, seconds in metrics.stages.items():
+                self.stage_seconds.observe(seconds, source=metrics.source, stage=name)
+            for kind, nbytes in metrics.sizes.items():
+                self.output_bytes.observe(nbytes, kind=kind)
+            if metrics.items is not None:
+                self.items.observe(metrics.items, source=metrics.source)
+
+    def render_text(self):
+        with self._lock:
+            lines = []
+            for metric in self._metrics:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = PrometheusRegistry()
+add_metrics_hook(log_hook)
+add_metrics_hook(registry)
+
+
+# === HTTP ENDPOINT ===
+def _metrics_handler():
+    # http.server is only imported when the endpoint is actually started
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host=METRICS_HOST):
+    """Serve /metrics from a daemon thread; only the first call per process does anything."""
+    global _server, _server_started
+    port = METRICS_PORT if port is None else port
+    if not port or str(port) == '0':
+        return None
+    with _server_lock:
+        if _server_started:
+            return _server
+        _server_started = True
+        from http.server import ThreadingHTTPServer
+
+        try:
+            _server = ThreadingHTTPServer((host, int(port)), _metrics_handler())
+        except OSError as e:
+            # Usually another app instance already serving on this port
+            logger.warning("metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
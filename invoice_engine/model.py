@@ -0,0 +1,142 @@
+# Invoice data and the text formatting shared by every renderer. Kept free of
+# python-docx so the store, the number allocator and the batch driver import fast.
+import csv
+import io
+import re
+
+LATE_FEE_RATE = 0.02
+FINANCIAL_TOKENS = ('[subtotal]', '[tax]', '[discount]', '[latefee]', '[grandtotal]')
+ITEM_FIELDS = ('description', 'unit_price', 'quantity')
+
+
+class InvoiceData:
+    def __init__(self):
+        self.client_info = {}
+        self.invoice_details = {}
+        self.items = []
+        self.financials = {}
+        self.apply_late_fee = False
+        self.mark_as_paid = False
+        self.invoice_number = ""
+        self.signature = ""
+        # Registry name of the template to render with; "" is the default
+        self.template = ""
+
+    def to_dict(self):
+        return {
+            "client_info": self.client_info,
+            "invoice_details": self.invoice_details,
+            "items": self.items,
+            "financials": self.financials,
+            "apply_late_fee": self.apply_late_fee,
+            "mark_as_paid": self.mark_as_paid,
+            "invoice_number": self.invoice_number,
+            "signature": self.signature,
+            "template": self.template
+        }
+
+    @staticmethod
+    def from_dict(data):
+        invoice = InvoiceData()
+        invoice.client_info = data.get("client_info", {})
+        invoice.invoice_details = data.get("invoice_details", {})
+        invoice.items = data.get("items", [])
+        invoice.financials = data.get("financials", {})
+        invoice.apply_late_fee = data.get("apply_late_fee", False)
+        invoice.mark_as_paid = data.get("mark_as_paid", False)
+        invoice.invoice_number = data.get("invoice_number", "")
+        invoice.signature = data.get("signature", "")
+        invoice.template = data.get("template", "")
+        return invoice
+
+
+def _item_number(value):
+    # Blank cells come back from the editor as None or NaN
+    if value is None or value == '':
+        return 0.0
+    value = float(value)
+    return 0.0 if value != value else value
+
+
+def complete_items(rows):
+    """Item dicts, totals included, for the editor rows that can go on an invoice: described, priced and counted."""
+    items = []
+    for row in rows:
+        description = row.get('description') or ''
+        unit_price = _item_number(row.get('unit_price'))
+        quantity = _item_number(row.get('quantity'))
+        if description.strip() and unit_price > 0 and quantity > 0:
+            items.append({'description': description, 'unit_price': unit_price, 'quantity': quantity,
+                          'total': unit_price * quantity})
+    return items
+
+
+def items_from_csv(text):
+    """Parse pasted or uploaded CSV into editor rows: description, unit_price, quantity.
+
+    Tab-separated text (a spreadsheet paste) works too. A header row naming
+    the columns may come first; without one the columns are taken in that
+    order.
+    """
+    text = text.lstrip('\ufeff')
+    first_line = text.split('\n', 1)[0]
+    delimiter = '\t' if '\t' in first_line else ';' if ';' in first_line and ',' not in first_line else ','
+    rows = [row for row in csv.reader(io.StringIO(text), delimiter=delimiter) if any(cell.strip() for cell in row)]
+    fields = list(ITEM_FIELDS)
+    if rows and 'description' in [cell.strip().lower() for cell in rows[0]]:
+        fields = [cell.strip().lower() for cell in rows.pop(0)]
+    missing = [field for field in ITEM_FIELDS if field not in fields]
+    if missing:
+        raise ValueError(f"Item CSV has no {', '.join(missing)} column")
+    items = []
+    for line, row in enumerate(rows, 1):
+        values = dict(zip(fields, row))
+        try:
+            items.append({'description': values.get('description', ''),
+                          'unit_price': _item_number(values.get('unit_price', '').strip()),
+                          'quantity': _item_number(values.get('quantity', '').strip())})
+        except ValueError:
+            raise ValueError(f"Item CSV row {line}: unit_price and quantity must be numbers")
+    return items
+
+
+def format_currency(amount):
+    if amount == 0:
+        return ""
+    elif amount == int(amount):
+        return f"Rp {int(amount):,}"
+    else:
+        return f"Rp {amount:,.2f}"
+
+
+def compute_financials(subtotal, tax_rate=0.0, discount=0.0, apply_late_fee=False):
+    # tax_rate is a percentage, as entered in the forms
+    tax = subtotal * (tax_rate / 100)
+    late_fee = subtotal * LATE_FEE_RATE if apply_late_fee else 0
+    total = subtotal + tax - discount + late_fee
+    return {
+        '[subtotal]': format_currency(subtotal),
+        '[tax]': format_currency(tax),
+        '[discount]': format_currency(discount),
+        '[latefee]': format_currency(late_fee),
+        '[grandtotal]': format_currency(total)
+    }
+
+
+def format_quantity(quantity):
+    if quantity == int(quantity):
+        return str(int(quantity))
+    return str(quantity)
+
+
+def sanitize_filename(name):
+    # Remove or replace characters that are invalid in file names
+    return re.sub(r'[<>:"/\\|?*]', '_', name).replace(' ', '_')
+
+
+def invoice_filenames(invoice_data):
+    # Generate file names based on paid status and client name
+    client_name = sanitize_filename(invoice_data.client_info['{{client_name}}'])
+    prefix = "Paid_Invoice" if invoice_data.mark_as_paid else "Invoice"
+    base_filename = f"{prefix}_{invoice_data.invoice_number}_{client_name}"
+    return f"{base_filename}.docx", f"{base_filename}.pdf"
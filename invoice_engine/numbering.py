@@ -0,0 +1,133 @@
+import os
+import re
+import threading
+from datetime import datetime
+
+from .store import get_store
+
+INVOICE_PREFIX = "INV"
+LEGACY_COUNT_FILE = "invoice_count.txt"
+# invoice_count.txt predates per-year sequences; every number it counted was INV2025...
+LEGACY_COUNT_YEAR = 2025
+
+_NUMBER_RE = re.compile(r'^' + INVOICE_PREFIX + r'(\d{4})(\d{3,})$')
+
+
+def format_invoice_number(year, sequence):
+    return f"{INVOICE_PREFIX}{year}{sequence:03d}"
+
+
+def parse_invoice_number(invoice_number):
+    """(year, sequence) for a number like INV2025001, or None if it has another shape."""
+    match = _NUMBER_RE.match(invoice_number or '')
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def is_valid_invoice_number(invoice_number):
+    return parse_invoice_number(invoice_number) is not None
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from per-year sequences kept in the invoice store.
+
+    Each allocation is one BEGIN IMMEDIATE transaction, so every process and
+    session sharing the database (the web app, the desktop app, batch jobs)
+    gets distinct numbers. reserve_block() takes many numbers in one step.
+    """
+
+    def __init__(self, store=None, legacy_count_file=LEGACY_COUNT_FILE):
+        self.store = store if store is not None else get_store()
+        if legacy_count_file:
+            self.import_count_file(legacy_count_file)
+
+    def _last(self, conn, year):
+        row = conn.execute("SELECT last FROM invoice_sequences WHERE year = ?", (year,)).fetchone()
+        if row is not None:
+            return row[0]
+        # First number of the year: start above anything already saved under it
+        prefix = f"{INVOICE_PREFIX}{year}"
+        last = 0
+        for (invoice_number,) in conn.execute(
+                "SELECT invoice_number FROM invoices WHERE invoice_number >= ? AND invoice_number < ?",
+                (prefix, prefix + ':')):
+            parsed = parse_invoice_number(invoice_number)
+            if parsed is not None and parsed[0] == year:
+                last = max(last, parsed[1])
+        return last
+
+    def _set_last(self, conn, year, last):
+        conn.execute("INSERT INTO invoice_sequences (year, last) VALUES (?, ?) "
+                     "ON CONFLICT(year) DO UPDATE SET last = MAX(last, excluded.last)", (year, last))
+
+    def _transaction(self, action):
+        conn = self.store.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = action(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def peek(self, year=None):
+        """The number allocate() would return now; nothing is reserved."""
+        year = year or datetime.now().year
+        return format_invoice_number(year, self._last(self.store.conn, year) + 1)
+
+    def allocate(self, year=None):
+        return self.reserve_block(1, year)[0]
+
+    def reserve_block(self, size, year=None):
+        if size < 1:
+            return []
+        year = year or datetime.now().year
+
+        def reserve(conn):
+            last = self._last(conn, year)
+            self._set_last(conn, year, last + size)
+            return last
+
+        first = self._transaction(reserve) + 1
+        return [format_invoice_number(year, sequence) for sequence in range(first, first + size)]
+
+    def observe(self, invoice_number):
+        # A number typed in by hand moves its year's sequence past it
+        parsed = parse_invoice_number(invoice_number)
+        if parsed is None:
+            return
+        year, sequence = parsed
+        self._transaction(lambda conn: self._set_last(conn, year, max(self._last(conn, year), sequence)))
+
+    def import_count_file(self, count_file):
+        """Carry the old invoice_count.txt counter over to the LEGACY_COUNT_YEAR sequence, once."""
+        if not os.path.exists(count_file):
+            return
+        try:
+            with open(count_file, 'r') as f:
+                count = int(f.read().strip())
+        except ValueError:
+            count = 0
+        marker = 'imported:' + os.path.abspath(count_file)
+
+        def carry_over(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return
+            self._set_last(conn, LEGACY_COUNT_YEAR, max(self._last(conn, LEGACY_COUNT_YEAR), count))
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(count)))
+
+        self._transaction(carry_over)
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = InvoiceNumberAllocator()
+        return _allocator
@@ -0,0 +1,338 @@
+import html
+import io
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx.oxml.ns import qn
+
+from .document import InvoiceData, build_invoice_document, build_replacements, format_currency, format_quantity
+from .model import FINANCIAL_TOKENS, compute_financials
+from .placeholders import _BREAK_RE, find_placeholders
+from .reproducible import read_raw_member, save_docx, write_raw_member, zip_info
+from .template import get_template
+
+# Private-use characters delimit the markers compiled into the skeleton XML;
+# they cannot collide with template text or invoice values.
+_MARK_OPEN = '\ue000'
+_MARK_CLOSE = '\ue001'
+_MARKER_RE = re.compile(f'{_MARK_OPEN}(\\d+){_MARK_CLOSE}')
+# Around each w:t holding markers (or its whole run, when an empty value
+# drops the run) until the skeleton XML has been split up
+_TEXT_OPEN = '\ue002'
+_RUN_OPEN = '\ue003'
+_TEXT_CLOSE = '\ue004'
+_TEXT_RE = re.compile(f'([{_TEXT_OPEN}{_RUN_OPEN}])(.*?){_TEXT_CLOSE}', re.S)
+_T_RE = re.compile(r'(<w:t(?:\s[^>]*)?>)(.*?)</w:t>', re.S)
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Anything that needs escaping, a w:tab/w:br, or is rejected
+_SPECIAL_RE = re.compile('[&<>\x00-\x1f]')
+_W_T = qn('w:t')
+_W_R = qn('w:r')
+_W_RPR = qn('w:rPr')
+
+_ITEM_FIELDS = ('description', 'unit_price', 'quantity', 'total')
+_FLUSH_SIZE = 64 * 1024
+
+
+# === SKELETON COMPILATION ===
+def _marker(index):
+    return f'{_MARK_OPEN}{index}{_MARK_CLOSE}'
+
+
+def _split_chunks(xml):
+    # 'a<m1>b<m2>c' -> ['a', 1, 'b', 2, 'c']: literals at even positions
+    parts = _MARKER_RE.split(xml)
+    return [int(part) if i % 2 else part for i, part in enumerate(parts)]
+
+
+def _t_xml(plain, preserved, text):
+    open_tag = preserved if text[0].isspace() or text[-1].isspace() else plain
+    return f'{open_tag}{escape(text)}</w:t>'
+
+
+def _wrap(node, opening):
+    # Delimits the node in the serialized XML through the text around it
+    previous = node.getprevious()
+    if previous is not None:
+        previous.tail = (previous.tail or '') + opening
+    else:
+        parent = node.getparent()
+        parent.text = (parent.text or '') + opening
+    node.tail = _TEXT_CLOSE + (node.tail or '')
+
+
+class _Text:
+    """A w:t holding markers, rewritten per invoice as the pipeline would.
+
+    Whitespace at either end gets xml:space="preserve", tabs and line breaks
+    become w:tab/w:br, and an empty text drops the w:t, or the run when
+    `drop_run` and nothing but its properties is left.
+    """
+
+    def __init__(self, xml, drop_run):
+        match = _T_RE.search(xml)
+        self.prefix = xml[:match.start()]
+        self.suffix = xml[match.end():]
+        self.plain = match.group(1).replace(' xml:space="preserve"', '')
+        self.preserved = self.plain[:-1] + ' xml:space="preserve">'
+        self.chunks = [int(part) if i % 2 else html.unescape(part)
+                       for i, part in enumerate(_MARKER_RE.split(match.group(2)))]
+        # The usual case, a text that is nothing but one value
+        self.value = self.chunks[1] if len(self.chunks) == 3 and not self.chunks[0] and not self.chunks[2] else None
+        self.drop_run = drop_run
+
+    def render(self, values):
+        if self.value is not None:
+            text = values[self.value]
+        else:
+            text = ''.join([values[chunk] if i % 2 else chunk for i, chunk in enumerate(self.chunks)])
+        if not text:
+            return '' if self.drop_run else self.prefix + self.suffix
+        if _SPECIAL_RE.search(text) is None:
+            open_tag = self.preserved if text[0].isspace() or text[-1].isspace() else self.plain
+            return f'{self.prefix}{open_tag}{text}</w:t>{self.suffix}'
+        if _INVALID_XML_RE.search(text):
+            raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+        if '\t' in text or '\n' in text or '\r' in text:
+            nodes = []
+            for i, piece in enumerate(_BREAK_RE.split(text)):
+                if i % 2:
+                    nodes.append('<w:tab/>' if piece == '\t' else '<w:br/>')
+                elif piece:
+                    nodes.append(_t_xml('<w:t>', '<w:t xml:space="preserve">', piece))
+            return self.prefix + ''.join(nodes) + self.suffix
+        return self.prefix + _t_xml(self.plain, self.preserved, text) + self.suffix
+
+
+class _Member:
+    def __init__(self, info, raw=None, head=None, row=None, tail=None):
+        self.info = info
+        self.raw = raw
+        self.head = head
+        self.row = row
+        self.tail = tail
+
+
+class _Skeleton:
+    """One compiled (late fee, paid) variant of the rendered template."""
+
+    def __init__(self, template, apply_late_fee, mark_as_paid):
+        probe = template.new_document()
+        self.tokens = sorted(find_placeholders(probe))
+        self.item_markers = {}
+        replacements = {}
+        for index, token in enumerate(self.tokens):
+            replacements[token] = _marker(index)
+        for offset, field in enumerate(_ITEM_FIELDS):
+            self.item_markers[len(self.tokens) + offset] = field
+
+        sentinel = InvoiceData()
+        sentinel.apply_late_fee = apply_late_fee
+        sentinel.mark_as_paid = mark_as_paid
+        sentinel.items = [{'description': _marker(len(self.tokens)), 'unit_price': 1, 'quantity': 1, 'total': 1}]
+        doc = build_invoice_document(sentinel, template=template, replacements=replacements)
+
+        # Put markers into the remaining cells of the sentinel item row
+        row_marker = _marker(len(self.tokens))
+        for row in doc.tables[template.items_table].rows:
+            if row.cells[0].text == row_marker:
+                for offset in range(1, len(_ITEM_FIELDS)):
+                    row.cells[offset].paragraphs[0].runs[0].text = _marker(len(self.tokens) + offset)
+                item_tr = row._tr
+                break
+        else:
+            raise ValueError('Could not locate the item row in the compiled template')
+        stories = [doc.element] + [part.element for part in doc.part.package.iter_parts()
+                                   if part.partname.startswith(('/word/header', '/word/footer'))]
+        for story in stories:
+            for t in list(story.iter(_W_T)):
+                if not t.text or _MARK_OPEN not in t.text:
+                    continue
+                run = t.getparent()
+                # Placeholders drop a run left with nothing but its properties;
+                # item cells keep theirs
+                if (run.tag == _W_R and item_tr not in t.iterancestors()
+                        and all(child is t or child.tag == _W_RPR for child in run)):
+                    _wrap(run, _RUN_OPEN)
+                else:
+                    _wrap(t, _TEXT_OPEN)
+
+        buffer = io.BytesIO()
+        # Deterministic by default, so every render of an invoice is byte-identical
+        save_docx(doc, buffer, template=template)
+        self.texts = []
+        self.members = []
+        with zipfile.ZipFile(buffer) as zf:
+            for info in zf.infolist():
+                data = zf.read(info)
+                if info.filename == 'word/document.xml':
+                    self.members.append(self._dynamic_document(info, data.decode('utf-8'), row_marker))
+                elif info.filename.endswith('.xml') and _MARK_OPEN.encode('utf-8') in data:
+                    self.members.append(_Member(info, head=self._compile(data.decode('utf-8'))))
+                else:
+                    self.members.append(_Member(info, raw=read_raw_member(zf, info)))
+
+        # Placeholders written out before the first item row; totals added up
+        # while streaming the rows cannot fill these
+        self.tokens_before_items = set()
+        for member in self.members:
+            if member.head is not None:
+                for chunk in member.head[1::2]:
+                    self.tokens_before_items.update(self.tokens[index] for index in self.texts[chunk].chunks[1::2]
+                                                    if index < len(self.tokens))
+            if member.row is not None:
+                break
+
+    def _compile(self, xml):
+        # Each delimited w:t (or run) becomes one marker indexing self.texts
+        def register(match):
+            self.texts.append(_Text(match.group(2), drop_run=match.group(1) == _RUN_OPEN))
+            return _marker(len(self.texts) - 1)
+
+        return _split_chunks(_TEXT_RE.sub(register, xml))
+
+    def _dynamic_document(self, info, xml, row_marker):
+        at = xml.index(row_marker)
+        row_start = max(xml.rfind('<w:tr>', 0, at), xml.rfind('<w:tr ', 0, at))
+        row_end = xml.index('</w:tr>', at) + len('</w:tr>')
+        return _Member(
+            info,
+            head=self._compile(xml[:row_start]),
+            row=self._compile(xml[row_start:row_end]),
+            tail=self._compile(xml[row_end:]),
+        )
+
+
+# === RENDERING ===
+class StreamingRenderer:
+    """Renders invoices straight into the .docx zip, bypassing python-docx.
+
+    The template is run through the regular pipeline once per variant with
+    marker values; afterwards each invoice only substitutes text into the
+    compiled document.xml and copies every other member as stored bytes.
+    """
+
+    def __init__(self, template=None):
+        self.template = template if template is not None else get_template()
+        self._skeletons = {}
+        self._lock = threading.Lock()
+
+    def _skeleton(self, apply_late_fee, mark_as_paid):
+        key = (bool(apply_late_fee), bool(mark_as_paid))
+        skeleton = self._skeletons.get(key)
+        if skeleton is None:
+            with self._lock:
+                skeleton = self._skeletons.get(key)
+                if skeleton is None:
+                    skeleton = _Skeleton(self.template, *key)
+                    self._skeletons[key] = skeleton
+        return skeleton
+
+    def render(self, invoice_data, stream=None):
+        return self._render(invoice_data, invoice_data.items, stream)
+
+    def render_items(self, invoice_data, items, stream=None, tax_rate=0.0, discount=0.0):
+        """Render with the line items pulled one at a time from `items`, any iterable.
+
+        Rows go straight into the compressed document.xml and the subtotal is
+        added up on the way, so memory stays flat however many items there
+        are; pass a file as `stream`, not a BytesIO. invoice_data.items is
+        ignored and invoice_data.financials is set from the streamed totals.
+        """
+        skeleton = self._skeleton(invoice_data.apply_late_fee, invoice_data.mark_as_paid)
+        early = skeleton.tokens_before_items.intersection(FINANCIAL_TOKENS)
+        if early:
+            raise ValueError(f"The template shows {', '.join(sorted(early))} before the item table; "
+                             "totals cannot be streamed")
+        subtotal = 0.0
+
+        def counted():
+            nonlocal subtotal
+            for item in items:
+                subtotal += item['total']
+                yield item
+
+        def totals():
+            invoice_data.financials = compute_financials(subtotal, tax_rate, discount, invoice_data.apply_late_fee)
+            return self._token_values(skeleton, build_replacements(invoice_data))
+
+        return self._render(invoice_data, counted(), stream, totals)
+
+    def _render(self, invoice_data, items, stream, after_items=None):
+        skeleton = self._skeleton(invoice_data.apply_late_fee, invoice_data.mark_as_paid)
+        values = self._token_values(skeleton, build_replacements(invoice_data))
+
+        output = stream if stream is not None else io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for member in skeleton.members:
+                if member.raw is not None:
+                    write_raw_member(zf, member.info, member.raw)
+                    continue
+                info = zip_info(member.info.filename)
+                info.date_time = member.info.date_time
+                info.external_attr = member.info.external_attr
+                info.create_system = member.info.create_system
+                with zf.open(info, 'w') as f:
+                    self._write_member(f, member, skeleton.texts, values, skeleton.item_markers, items, after_items)
+        if stream is None:
+            output.seek(0)
+        return output
+
+    @staticmethod
+    def _token_values(skeleton, replacements):
+        return {index: str(replacements.get(token, token)) for index, token in enumerate(skeleton.tokens)}
+
+    @staticmethod
+    def _write_member(f, member, texts, values, item_markers, items, after_items=None):
+        buffer = []
+        size = 0
+
+        def emit(chunks, values):
+            nonlocal size
+            for i, chunk in enumerate(chunks):
+                text = texts[chunk].render(values) if i % 2 else chunk
+                buffer.append(text)
+                size += len(text)
+            if size >= _FLUSH_SIZE:
+                flush()
+
+        def flush():
+            nonlocal size
+            f.write(''.join(buffer).encode('utf-8'))
+            buffer.clear()
+            size = 0
+
+        emit(member.head, values)
+        if member.row is not None:
+            for item in items:
+                item_values = {}
+                for index, field in item_markers.items():
+                    if field == 'description':
+                        item_values[index] = str(item['description'])
+                    elif field == 'quantity':
+                        item_values[index] = format_quantity(item['quantity'])
+                    else:
+                        item_values[index] = format_currency(item[field])
+                emit(member.row, item_values)
+            if after_items is not None:
+                # Placeholder values once every row is out; the dict is shared
+                # with the members still to come (headers, footers)
+                values.update(after_items())
+            emit(member.tail, values)
+        flush()
+
+
+_renderers_lock = threading.Lock()
+
+
+def get_streaming_renderer(template=None):
+    if template is None:
+        template = get_template()
+    # Kept on the template itself, so it goes when the registry evicts the template
+    with _renderers_lock:
+        renderer = template.compiled.get('streaming_renderer')
+        if renderer is None:
+            renderer = template.compiled['streaming_renderer'] = StreamingRenderer(template)
+        return renderer
@@ -0,0 +1,182 @@
+import atexit
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_WORKERS = int(os.environ.get("INVOICE_PDF_WORKERS", "2"))
+SHM_DIR = '/dev/shm'
+
+
+class ConversionError(Exception):
+    pass
+
+
+class ConversionTimeout(ConversionError):
+    pass
+
+
+def scratch_dir():
+    # Per-request files go to tmpfs when the machine has one
+    configured = os.environ.get("INVOICE_TMPDIR")
+    if configured:
+        return configured
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return None
+
+
+def pandoc_command(docx_path, pdf_path):
+    # Same invocation pypandoc.convert_file(docx, 'pdf', outputfile=pdf) builds
+    import pypandoc
+
+    return [pypandoc.get_pandoc_path(), '--from=docx', '--to=latex', docx_path, '--output=' + pdf_path]
+
+
+def convert_docx_file(docx_path, pdf_path, timeout=DEFAULT_TIMEOUT, on_start=None):
+    # pandoc runs LaTeX as a child; a session of its own lets a timeout kill the whole tree.
+    # on_start(pid) gets pandoc's pid, which is also its process group id.
+    process = subprocess.Popen(pandoc_command(docx_path, pdf_path), stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, start_new_session=True)
+    if on_start is not None:
+        on_start(process.pid)
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(process)
+        raise ConversionTimeout(f"PDF conversion of {docx_path} exceeded {timeout}s")
+    if process.returncode != 0:
+        raise ConversionError(f"pandoc exited with {process.returncode}: {stderr.decode(errors='replace').strip()}")
+
+
+def _kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+    process.wait()
+
+
+class ConversionResult:
+    def __init__(self, pdf_path, wait_ms, convert_ms):
+        self.pdf_path = pdf_path
+        self.pdf = None
+        self.wait_ms = wait_ms
+        self.convert_ms = convert_ms
+
+
+# === POOL ===
+class PdfConverterPool:
+    """Bounds how many pandoc conversions run at once.
+
+    Each job runs pandoc and LaTeX from the calling thread, in a session of
+    their own so a timeout kills the whole tree. A job waits at most its
+    timeout for a free slot and fails at once when the pool is closed;
+    close() also kills the conversions still running.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, history=1000):
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        # Process groups of the pandoc runs in progress
+        self._running = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._latencies = deque(maxlen=history)
+        self.counters = {'ok': 0, 'error': 0, 'timeout': 0}
+
+    def convert_file(self, docx_path, pdf_path, timeout=None):
+        if self._closed:
+            raise ConversionError("PDF converter pool is closed")
+        timeout = timeout or self.timeout
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            self._record('timeout')
+            raise ConversionTimeout(f"No PDF conversion slot came free within {timeout}s for {docx_path}")
+        started_groups = []
+
+        def started(pid):
+            with self._lock:
+                self._running.add(pid)
+            started_groups.append(pid)
+
+        try:
+            if self._closed:
+                raise ConversionError("PDF converter pool is closed")
+            wait_ms = (time.perf_counter() - queued) * 1000
+            started_at = time.perf_counter()
+            convert_docx_file(docx_path, pdf_path, timeout, on_start=started)
+        except ConversionTimeout:
+            self._record('timeout')
+            raise
+        except ConversionError:
+            self._record('error')
+            raise
+        except Exception as e:
+            self._record('error')
+            raise ConversionError(str(e)) from e
+        finally:
+            with self._lock:
+                self._running.difference_update(started_groups)
+            self._slots.release()
+        convert_ms = (time.perf_counter() - started_at) * 1000
+        self._record('ok', convert_ms)
+        return ConversionResult(pdf_path, wait_ms, convert_ms)
+
+    def convert(self, docx_bytes, timeout=None):
+        # A private directory per request (mode 0700, unique name) so two
+        # sessions converting the same invoice number never share files.
+        with tempfile.TemporaryDirectory(prefix='invoice-pdf-', dir=scratch_dir()) as workdir:
+            docx_path = os.path.join(workdir, 'invoice.docx')
+            pdf_path = os.path.join(workdir, 'invoice.pdf')
+            with open(docx_path, 'wb') as f:
+                f.write(docx_bytes)
+            result = self.convert_file(docx_path, pdf_path, timeout)
+            with open(pdf_path, 'rb') as f:
+                result.pdf = f.read()
+        result.pdf_path = None
+        return result
+
+    def _record(self, status, convert_ms=None):
+        with self._lock:
+            self.counters[status] += 1
+            if convert_ms is not None:
+                self._latencies.append(convert_ms)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counters, workers=self.workers, running=len(self._running))
+        if latencies:
+            stats['p50_ms'] = latencies[len(latencies) // 2]
+            stats['p95_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['max_ms'] = latencies[-1]
+        return stats
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            groups = list(self._running)
+        for pgid in groups:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_converter():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PdfConverterPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,150 @@
+import re
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+# {{client_name}} style fields and [subtotal] style amounts
+TOKEN_RE = re.compile(r'\{\{[^{}]*\}\}|\[[^\[\]]*\]')
+
+_W_P = qn('w:p')
+_W_R = qn('w:r')
+_W_T = qn('w:t')
+_W_HYPERLINK = qn('w:hyperlink')
+_W_RPR = qn('w:rPr')
+_XML_SPACE = qn('xml:space')
+# Where a value needs a w:tab or w:br, the way python-docx's run.text setter splits it
+_BREAK_RE = re.compile(r'(\t|\r|\n)')
+
+
+def _paragraph_runs(p):
+    for child in p:
+        if child.tag == _W_R:
+            yield child
+        elif child.tag == _W_HYPERLINK:
+            for r in child:
+                if r.tag == _W_R:
+                    yield r
+
+
+def _paragraph_texts(p):
+    # The w:t nodes of the paragraph's own runs, in reading order
+    for r in _paragraph_runs(p):
+        for child in r:
+            if child.tag == _W_T:
+                yield child
+
+
+def _new_t(text):
+    t = OxmlElement('w:t')
+    t.text = text
+    if text[0].isspace() or text[-1].isspace():
+        t.set(_XML_SPACE, 'preserve')
+    return t
+
+
+def _set_t_text(t, text):
+    # Rewrites one w:t in place. Tabs and line breaks in the value become
+    # w:tab/w:br siblings; the run's other children (fields, page breaks,
+    # drawings) are never touched.
+    pieces = _BREAK_RE.split(text)
+    nodes = []
+    for i, piece in enumerate(pieces):
+        if i % 2:
+            nodes.append(OxmlElement('w:tab' if piece == '\t' else 'w:br'))
+        elif piece:
+            nodes.append(_new_t(piece))
+    if len(nodes) == 1 and nodes[0].tag == _W_T:
+        t.text = nodes[0].text
+        if _XML_SPACE in nodes[0].attrib:
+            t.set(_XML_SPACE, 'preserve')
+        else:
+            t.attrib.pop(_XML_SPACE, None)
+        return
+    for node in nodes:
+        t.addprevious(node)
+    t.getparent().remove(t)
+
+
+def _substitute_paragraph(p, replacements):
+    # Cheap reject before touching any run: no token can start here.
+    raw = ''.join(p.itertext(_W_T))
+    if '{{' not in raw and '[' not in raw:
+        return 0
+
+    nodes = list(_paragraph_texts(p))
+    texts = [t.text or '' for t in nodes]
+    full = ''.join(texts)
+    matches = [m for m in TOKEN_RE.finditer(full) if m.group() in replacements]
+    if not matches:
+        return 0
+
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    new_texts = list(texts)
+    changed = set()
+    # Right to left, so earlier offsets stay valid while text nodes are rewritten.
+    for m in reversed(matches):
+        value = replacements[m.group()]
+        begin, end = m.span()
+        for i in range(len(nodes) - 1, -1, -1):
+            node_begin = starts[i]
+            node_end = node_begin + len(texts[i])
+            if node_end <= begin or node_begin >= end or node_begin == node_end:
+                continue
+            local_begin = max(begin, node_begin) - node_begin
+            local_end = min(end, node_end) - node_begin
+            text = new_texts[i]
+            # The token's first text node receives the value and keeps its run's formatting.
+            middle = value if node_begin <= begin else ''
+            new_texts[i] = text[:local_begin] + middle + text[local_end:]
+            changed.add(i)
+
+    # A run left with nothing but its rPr goes too
+    for i in changed:
+        t = nodes[i]
+        if new_texts[i]:
+            _set_t_text(t, new_texts[i])
+            continue
+        run = t.getparent()
+        run.remove(t)
+        if all(child.tag == _W_RPR for child in run):
+            run.getparent().remove(run)
+    return len(matches)
+
+
+def _story_elements(doc):
+    yield doc.element.body
+    for part in doc.part.package.iter_parts():
+        if part.partname.startswith(('/word/header', '/word/footer')):
+            yield part.element
+
+
+def substitute_placeholders(doc, replacements):
+    """Replace every known token in the body, headers and footers in one pass.
+
+    Tokens split across runs are handled; the rewritten text stays in the run
+    the token started in, so run formatting is preserved. Returns the number
+    of tokens replaced.
+    """
+    count = 0
+    for element in _story_elements(doc):
+        for p in element.iter(_W_P):
+            count += _substitute_paragraph(p, replacements)
+    return count
+
+
+def find_placeholders(doc):
+    tokens = set()
+    for element in _story_elements(doc):
+        for p in element.iter(_W_P):
+            tokens.update(TOKEN_RE.findall(''.join(t.text or '' for t in _paragraph_texts(p))))
+    return tokens
+
+
+def replace_placeholders(doc, replacements):
+    substitute_placeholders(doc, replacements)
+    return doc
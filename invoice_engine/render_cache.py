@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .assets import PAID_STAMP_URL, SIGNATURE_URL, get_asset
+
+RENDER_CACHE_DIR = os.environ.get("INVOICE_RENDER_CACHE", ".render_cache")
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("INVOICE_RENDER_CACHE_MB", "256")) * 1024 * 1024
+# Bump when a code change alters the rendered output, so older entries stop matching
+RENDER_VERSION = 5
+
+
+def artifact_key(invoice_data, template):
+    """Hash of everything a rendered invoice depends on: its fields, the template and, once paid, the stamp images."""
+    payload = json.dumps(invoice_data.to_dict(), sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256()
+    digest.update(f"{RENDER_VERSION}:{template.version}:".encode('utf-8'))
+    digest.update(payload.encode('utf-8'))
+    if invoice_data.mark_as_paid:
+        # A refreshed stamp or signature download must not serve the old render
+        try:
+            for url in (PAID_STAMP_URL, SIGNATURE_URL):
+                digest.update(f":{hashlib.sha256(get_asset(url)).hexdigest()}".encode('utf-8'))
+        except Exception as e:
+            raise Exception(f"Failed to add stamp and signature: {str(e)}")
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """Rendered DOCX/PDF bytes on disk, named <key>.<kind>, evicted least recently used.
+
+    Any change to an invoice (marking it paid included) or to the template
+    changes its key, so stale entries are never served; they just age out
+    once the cache is over max_bytes. File mtimes carry the recency across
+    restarts.
+    """
+
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith('.tmp-'):
+                stat = entry.stat()
+                found.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._size += size
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, key, kind):
+        name = f"{key}.{kind}"
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            with open(self._path(name), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except OSError:
+            # Removed behind our back (another process evicted it, or a manual cleanup)
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def put(self, key, kind, data):
+        name = f"{key}.{kind}"
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        with self._lock:
+            self._size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            evicted = []
+            while self._size > self.max_bytes:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(self._path(old_name))
+            except OSError:
+                pass
+
+    def get_or_render(self, key, kind, render):
+        data = self.get(key, kind)
+        if data is None:
+            data = render()
+            self.put(key, kind, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache()
+        return _cache
@@ -0,0 +1,248 @@
+import gc
+import multiprocessing
+import os
+from collections import deque
+from multiprocessing.connection import wait
+
+from .pdf import DEFAULT_TIMEOUT
+from .template import DEFAULT_TEMPLATE
+
+DEFAULT_MAX_TASKS_PER_WORKER = 0  # 0: no limit
+DEFAULT_MAX_WORKER_MB = 0  # 0: no limit
+DEFAULT_RETRIES = 1
+
+
+def warm_up(template):
+    """Load everything a render needs once: template, compiled skeletons, stamp images, pandoc path."""
+    from .assets import PAID_STAMP_URL, SIGNATURE_URL, get_asset
+    from .ooxml import get_streaming_renderer
+    from .template import get_template
+
+    # Templates that only some records name are compiled by each worker on first use
+    renderer = get_streaming_renderer(get_template(template))
+    for apply_late_fee in (False, True):
+        for mark_as_paid in (False, True):
+            try:
+                renderer._skeleton(apply_late_fee, mark_as_paid)
+            except Exception:
+                # Paid skeletons need the images; without them each render reports its own error
+                pass
+    for url in (PAID_STAMP_URL, SIGNATURE_URL):
+        try:
+            get_asset(url)
+        except Exception:
+            pass
+    try:
+        import pypandoc
+
+        pypandoc.get_pandoc_path()
+    except Exception:
+        pass
+
+
+def _private_mb():
+    # Unique set size: pages only this process maps. Copy-on-write pages still
+    # shared with the warmed-up parent count as shared here, unlike in statm.
+    # None where smaps_rollup is unavailable (not Linux, or older than 4.14).
+    try:
+        private_kb = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    private_kb += int(line.split()[1])
+        return private_kb / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker_main(conn, settings, warmed):
+    from .batch import render_record
+
+    if not warmed:
+        warm_up(settings['template'])
+    done = 0
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        index, record = task
+        result = render_record(index, record, settings['output_dir'], settings['template'],
+                               settings['pdf'], settings['pdf_timeout'], settings['skip_unchanged'])
+        done += 1
+        # Recycle when over a cap; the parent starts a fresh worker from the warm state
+        recycle = bool((settings['max_tasks'] and done >= settings['max_tasks'])
+                       or (settings['max_mb'] and _private_mb() > settings['max_mb']))
+        conn.send((result, recycle))
+        if recycle:
+            break
+
+
+class _Worker:
+    def __init__(self, ctx, settings, warmed):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, settings, warmed), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    """Batch render workers forked from a warmed-up parent.
+
+    The parent compiles the template and the streaming skeletons, fetches
+    the stamp images and freezes the GC before forking, so every worker
+    starts with them already in (copy-on-write shared) memory. Results come
+    back as they finish, or in input order with ordered=True. A task whose
+    worker dies is retried up to `retries` times on a fresh worker. Workers
+    are replaced after `max_tasks_per_worker` renders or once their unique
+    set size (Private_Clean + Private_Dirty in /proc/self/smaps_rollup)
+    passes `max_worker_mb`; that cap needs Linux. Where fork is unavailable,
+    workers are spawned and warm themselves up.
+    """
+
+    def __init__(self, output_dir, workers=None, template=DEFAULT_TEMPLATE, pdf=True,
+                 pdf_timeout=DEFAULT_TIMEOUT, max_tasks_per_worker=DEFAULT_MAX_TASKS_PER_WORKER,
+                 max_worker_mb=DEFAULT_MAX_WORKER_MB, retries=DEFAULT_RETRIES, skip_unchanged=False):
+        if max_worker_mb and _private_mb() is None:
+            raise ValueError("max_worker_mb needs /proc/self/smaps_rollup (Linux 4.14 or newer)")
+        self.workers = workers or os.cpu_count() or 1
+        self.retries = retries
+        self.settings = {
+            'output_dir': output_dir,
+            # Paths made absolute so spawned workers resolve the same file
+            'template': os.path.abspath(template) if template.lower().endswith('.docx') else template,
+            'pdf': pdf,
+            'pdf_timeout': pdf_timeout,
+            'skip_unchanged': skip_unchanged,
+            'max_tasks': max_tasks_per_worker,
+            'max_mb': max_worker_mb,
+        }
+        self.counters = {'retries': 0, 'recycled': 0, 'crashed': 0}
+        self._forked = 'fork' in multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context('fork' if self._forked else 'spawn')
+        self._pool = []
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return
+        if self._forked:
+            warm_up(self.settings['template'])
+            # Objects that exist now are never touched by the children's collector,
+            # so their pages stay shared instead of being copied on the first GC pass
+            gc.freeze()
+        self._pool = [self._spawn() for _ in range(self.workers)]
+        self._started = True
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.settings, self._forked)
+
+    def _replace(self, worker):
+        worker.stop()
+        self._pool[self._pool.index(worker)] = self._spawn()
+
+    def imap(self, records, ordered=False):
+        """Yield one render_record result per record, as they complete (or in input order)."""
+        self.start()
+        source = enumerate(records)
+        retry_queue = deque()
+        attempts = {}
+        buffered = {}
+        next_index = 0
+        exhausted = False
+
+        def next_task():
+            nonlocal exhausted
+            if retry_queue:
+                return retry_queue.popleft()
+            if exhausted:
+                return None
+            try:
+                return next(source)
+            except StopIteration:
+                exhausted = True
+                return None
+
+        while True:
+            for worker in self._pool:
+                if worker.task is None:
+                    task = next_task()
+                    if task is None:
+                        break
+                    worker.task = task
+                    worker.conn.send(task)
+            busy = [worker for worker in self._pool if worker.task is not None]
+            if not busy:
+                break
+
+            ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy])
+            finished = []
+            for worker in busy:
+                if worker.conn not in ready and worker.process.sentinel not in ready:
+                    continue
+                index, record = worker.task
+                try:
+                    # A worker that exits right after answering (a recycle) is still readable
+                    if not worker.conn.poll():
+                        raise EOFError
+                    result, recycle = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.task = None
+                    self.counters['crashed'] += 1
+                    exitcode = worker.process.exitcode
+                    self._replace(worker)
+                    attempts[index] = attempts.get(index, 0) + 1
+                    if attempts[index] <= self.retries:
+                        self.counters['retries'] += 1
+                        retry_queue.append((index, record))
+                        continue
+                    result = {'index': index, 'invoice_number': record.get('invoice_number', ''),
+                              'status': 'error', 'error': f"render worker died (exit code {exitcode})",
+                              'attempts': attempts[index]}
+                    finished.append(result)
+                    continue
+                worker.task = None
+                if recycle:
+                    self.counters['recycled'] += 1
+                    self._replace(worker)
+                if index in attempts:
+                    result['attempts'] = attempts[index] + 1
+                finished.append(result)
+
+            for result in finished:
+                if not ordered:
+                    yield result
+                    continue
+                buffered[result['index']] = result
+                while next_index in buffered:
+                    yield buffered.pop(next_index)
+                    next_index += 1
+
+    def close(self):
+        for worker in self._pool:
+            worker.stop()
+        self._pool = []
+        self._started = False
+        if self._forked:
+            gc.unfreeze()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
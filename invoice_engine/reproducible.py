@@ -0,0 +1,192 @@
+import datetime
+import hashlib
+import io
+import os
+import struct
+import zipfile
+import zlib
+
+from .template import _PER_INVOICE_PARTS
+
+# Same inputs -> same bytes. On by default; INVOICE_DETERMINISTIC=0 restores
+# python-docx's own save (wall-clock zip timestamps, graph-walk member order).
+DETERMINISTIC = os.environ.get("INVOICE_DETERMINISTIC", "1") != "0"
+
+# Earliest time a zip header can hold; what Word itself writes
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+CORE_DATETIME = datetime.datetime(1980, 1, 1)
+# Deflate level for the members that are compressed per invoice; static
+# template members are copied through already compressed
+COMPRESS_LEVEL = int(os.environ.get("INVOICE_DOCX_COMPRESSLEVEL", "6"))
+_ZIP_EXTERNAL_ATTR = 0o600 << 16
+_ZIP_CREATE_SYSTEM = 3  # unix, whichever OS wrote the file
+
+_DOC_PR = '{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}docPr'
+
+
+def content_hash(data):
+    """sha256 of rendered bytes; with deterministic output it doubles as an ETag."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def zip_info(filename, compress_type=zipfile.ZIP_DEFLATED, compresslevel=None):
+    # A member header that carries nothing about when or where it was written
+    info = zipfile.ZipInfo(filename, ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    # Read by both writestr() and open('w'); ZipFile's own level only applies to plain names
+    info._compresslevel = COMPRESS_LEVEL if compresslevel is None else compresslevel
+    info.external_attr = _ZIP_EXTERNAL_ATTR
+    info.create_system = _ZIP_CREATE_SYSTEM
+    return info
+
+
+# === RAW ZIP MEMBER COPY ===
+def read_raw_member(zf, info):
+    # Compressed bytes of a member exactly as stored, without inflating them
+    zf.fp.seek(info.header_offset)
+    header = zf.fp.read(zipfile.sizeFileHeader)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    zf.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+    return zf.fp.read(info.compress_size)
+
+
+def write_raw_member(zf, info, raw):
+    # zipfile has no public API for storing already-compressed data, so the
+    # local header is written by hand and the entry registered for the
+    # central directory the same way ZipFile.write does.
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    zinfo.flag_bits = info.flag_bits & ~0x08
+    with zf._lock:
+        if zf._writing:
+            raise ValueError("Can't write raw member while another member is open for writing")
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(False))
+        zf.fp.write(raw)
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf._didModify = True
+
+
+def read_static_member(zf, info):
+    """(header, compressed bytes) of a member to copy into every output unchanged."""
+    header = zip_info(info.filename, info.compress_type)
+    header.CRC = info.CRC
+    header.compress_size = info.compress_size
+    header.file_size = info.file_size
+    header.flag_bits = info.flag_bits
+    return header, read_raw_member(zf, info)
+
+
+def compress_static_member(filename, data, compresslevel=9):
+    """(header, compressed bytes) for data compressed once and then copied like a stored member."""
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    raw = compressor.compress(data) + compressor.flush()
+    header = zip_info(filename)
+    header.CRC = zlib.crc32(data)
+    header.compress_size = len(raw)
+    header.file_size = len(data)
+    return header, raw
+
+
+def renumber_drawings(doc):
+    # Drawing ids must be unique across the document; the template header and
+    # the paid stamp both start at 1. Numbered in part-name order.
+    next_id = 1
+    for part in sorted(doc.part.package.iter_parts(), key=lambda part: part.partname):
+        if not part.partname.startswith(_PER_INVOICE_PARTS):
+            continue
+        for doc_pr in part.element.iter(_DOC_PR):
+            doc_pr.set('id', str(next_id))
+            next_id += 1
+    return doc
+
+
+def pin_core_properties(doc):
+    # python-docx stamps the save time into core properties it has to create
+    # for a template without them; a Word-authored template keeps its own
+    core = doc.core_properties
+    if core.created is None:
+        core.created = CORE_DATETIME
+        core.modified = CORE_DATETIME
+    return doc
+
+
+class _FixedZipWriter:
+    # Stands in for python-docx's PhysPkgWriter: fixed headers, members buffered
+    # so they can be written in part-name order
+    def __init__(self, stream, compresslevel):
+        self._zipf = zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED)
+        self._compresslevel = compresslevel
+        self._members = []
+
+    def write(self, pack_uri, blob):
+        self._members.append((pack_uri.membername, blob, None))
+
+    def write_static(self, pack_uri, member):
+        self._members.append((pack_uri.membername, None, member))
+
+    def close(self):
+        # [Content_Types].xml and _rels/.rels come first, as python-docx writes them
+        head, parts = self._members[:2], sorted(self._members[2:], key=lambda member: member[0])
+        for membername, blob, static in head + parts:
+            if static is not None:
+                write_raw_member(self._zipf, *static)
+            else:
+                self._zipf.writestr(zip_info(membername, compresslevel=self._compresslevel), blob)
+        self._zipf.close()
+
+
+def save_docx(doc, stream=None, deterministic=None, template=None, compresslevel=None):
+    """Serialize a python-docx Document; returns the bytes when no stream is given.
+
+    In deterministic mode the zip members are written in a fixed order with
+    fixed timestamps and attributes, drawing ids are renumbered and core
+    properties never carry the save time, so identical invoices give
+    identical bytes (and content_hash()). Given the CompiledTemplate the
+    document came from, parts still shared with it are copied from the
+    template's zip as stored; only the rest is deflated, at `compresslevel`.
+    """
+    if deterministic is None:
+        deterministic = DETERMINISTIC
+    output = stream if stream is not None else io.BytesIO()
+    if not deterministic:
+        doc.save(output)
+    else:
+        from docx.opc.pkgwriter import PackageWriter
+
+        renumber_drawings(doc)
+        pin_core_properties(doc)
+        package = doc.part.package
+        parts = package.parts
+        for part in parts:
+            part.before_marshal()
+        writer = _FixedZipWriter(output, compresslevel)
+        PackageWriter._write_content_types_stream(writer, parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        for part in parts:
+            static = template.static_member(part) if template is not None else None
+            if static is not None:
+                writer.write_static(part.partname, static)
+            else:
+                writer.write(part.partname, part.blob)
+            if len(part._rels):
+                writer.write(part.partname.rels_uri, part._rels.xml)
+        writer.close()
+    if stream is None:
+        return output.getvalue()
+    return output
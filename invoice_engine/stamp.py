@@ -0,0 +1,108 @@
+import io
+
+import lxml.etree as ET
+from docx.oxml import parse_xml
+from docx.shared import Inches
+
+from .assets import PAID_STAMP_URL, SIGNATURE_URL, get_asset
+
+def add_paid_stamp_and_signature(doc):
+    try:
+        # Cached bytes go straight to python-docx: no download, temp file or re-encode
+        stamp_data = io.BytesIO(get_asset(PAID_STAMP_URL))
+        signature_data = io.BytesIO(get_asset(SIGNATURE_URL))
+
+        # Add the stamp at the end of the document
+        stamp_paragraph = doc.add_paragraph()
+        stamp_run = stamp_paragraph.add_run()
+        stamp_picture = stamp_run.add_picture(stamp_data, width=Inches(2.17), height=Inches(2.17))
+
+        # Access the run's XML element to find the drawing element
+        stamp_run_element = stamp_run._r
+        stamp_drawing_elements = stamp_run_element.xpath('.//w:drawing')
+        if not stamp_drawing_elements:
+            raise Exception("Could not find drawing element for stamp image")
+        stamp_drawing = stamp_drawing_elements[0]
+
+        # Find the a:graphic element to preserve the image data
+        graphic_elements = stamp_drawing.xpath('.//a:graphic', namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
+        if not graphic_elements:
+            raise Exception("Could not find a:graphic element in stamp drawing")
+        graphic_xml = ET.tostring(graphic_elements[0], encoding='unicode').replace('\n', '')
+
+        # Use desired positions for stamp
+        stamp_horizontal = 5.09 * 914400  # 5.09" in EMUs
+        stamp_vertical = 6.64 * 914400    # 6.64" in EMUs
+
+        # Replace the inline drawing with an anchored one using "In Front of Text" wrapping
+        stamp_drawing.getparent().replace(stamp_drawing, parse_xml(f"""
+            <w:drawing
+                xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+                xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">
+                <wp:anchor distT="0" distB="0" distL="0" distR="0" simplePos="0" relativeHeight="251" behindDoc="0" locked="0" layoutInCell="1" allowOverlap="1">
+                    <wp:simplePos x="0" y="0"/>
+                    <wp:positionH relativeFrom="page">
+                        <wp:posOffset>{int(stamp_horizontal)}</wp:posOffset>
+                    </wp:positionH>
+                    <wp:positionV relativeFrom="page">
+                        <wp:posOffset>{int(stamp_vertical)}</wp:posOffset>
+                    </wp:positionV>
+                    <wp:extent cx="{int(2.17 * 914400)}" cy="{int(2.17 * 914400)}"/>
+                    <wp:effectExtent l="0" t="0" r="0" b="0"/>
+                    <wp:wrapTopAndBottom/>
+                    <wp:docPr id="1" name="Picture 1"/>
+                    <wp:cNvGraphicFramePr/>
+                    {graphic_xml}
+                </wp:anchor>
+            </w:drawing>
+        """))
+
+        # Add the signature at the end of the document
+        signature_paragraph = doc.add_paragraph()
+        signature_run = signature_paragraph.add_run()
+        signature_picture = signature_run.add_picture(signature_data, width=Inches(1.92), height=Inches(1.92))
+
+        # Access the run's XML element to find the drawing element
+        signature_run_element = signature_run._r
+        signature_drawing_elements = signature_run_element.xpath('.//w:drawing')
+        if not signature_drawing_elements:
+            raise Exception("Could not find drawing element for signature image")
+        signature_drawing = signature_drawing_elements[0]
+
+        # Find the a:graphic element to preserve the image data
+        graphic_elements = signature_drawing.xpath('.//a:graphic', namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
+        if not graphic_elements:
+            raise Exception("Could not find a:graphic element in signature drawing")
+        graphic_xml = ET.tostring(graphic_elements[0], encoding='unicode').replace('\n', '')
+
+        # Use desired positions for signature
+        signature_horizontal = 5.64 * 914400  # 5.64" in EMUs
+        signature_vertical = 8.11 * 914400    # 8.11" in EMUs
+
+        # Replace the inline drawing with an anchored one using "In Front of Text" wrapping
+        signature_drawing.getparent().replace(signature_drawing, parse_xml(f"""
+            <w:drawing
+                xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+                xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">
+                <wp:anchor distT="0" distB="0" distL="0" distR="0" simplePos="0" relativeHeight="252" behindDoc="0" locked="0" layoutInCell="1" allowOverlap="1">
+                    <wp:simplePos x="0" y="0"/>
+                    <wp:positionH relativeFrom="page">
+                        <wp:posOffset>{int(signature_horizontal)}</wp:posOffset>
+                    </wp:positionH>
+                    <wp:positionV relativeFrom="page">
+                        <wp:posOffset>{int(signature_vertical)}</wp:posOffset>
+                    </wp:positionV>
+                    <wp:extent cx="{int(1.92 * 914400)}" cy="{int(1.92 * 914400)}"/>
+                    <wp:effectExtent l="0" t="0" r="0" b="0"/>
+                    <wp:wrapTopAndBottom/>
+                    <wp:docPr id="2" name="Picture 2"/>
+                    <wp:cNvGraphicFramePr/>
+                    {graphic_xml}
+                </wp:anchor>
+            </w:drawing>
+        """))
+
+        return doc
+
+    except Exception as e:
+        raise Exception(f"Failed to add stamp and signature: {str(e)}")
@@ -0,0 +1,281 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+from .model import InvoiceData
+
+DEFAULT_DB_PATH = os.environ.get("INVOICE_DB", "invoices.db")
+LEGACY_JSON_PATH = "invoices.json"
+
+# Columns pulled out of the JSON record so the View Invoices tab can filter
+# and page through invoices without parsing every record.
+_INDEX_COLUMNS = ('paid', 'client_name', 'invoice_date', 'due_date', 'grand_total')
+
+
+def _iso_date(value):
+    # Invoices store dates as dd.mm.yyyy; yyyy-mm-dd sorts correctly as text
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return ''
+
+
+def _index_values(record):
+    invoice_details = record.get('invoice_details', {})
+    return (
+        1 if record.get('mark_as_paid') else 0,
+        record.get('client_info', {}).get('{{client_name}}', ''),
+        _iso_date(invoice_details.get('{{invoice_date}}')),
+        _iso_date(invoice_details.get('{{due_date}}')),
+        record.get('financials', {}).get('[grandtotal]', ''),
+    )
+
+
+def _migrate_v1(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            invoice_number TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+def _migrate_v2(conn):
+    conn.execute("ALTER TABLE invoices ADD COLUMN paid INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE invoices ADD COLUMN client_name TEXT NOT NULL DEFAULT '' COLLATE NOCASE")
+    conn.execute("ALTER TABLE invoices ADD COLUMN invoice_date TEXT NOT NULL DEFAULT ''")
+    conn.execute("ALTER TABLE invoices ADD COLUMN due_date TEXT NOT NULL DEFAULT ''")
+    conn.execute("ALTER TABLE invoices ADD COLUMN grand_total TEXT NOT NULL DEFAULT ''")
+    rows = conn.execute("SELECT invoice_number, data FROM invoices").fetchall()
+    conn.executemany(
+        "UPDATE invoices SET paid = ?, client_name = ?, invoice_date = ?, due_date = ?, grand_total = ? "
+        "WHERE invoice_number = ?",
+        [_index_values(json.loads(data)) + (number,) for number, data in rows]
+    )
+    conn.execute("CREATE INDEX idx_invoices_date ON invoices (invoice_date, invoice_number)")
+    conn.execute("CREATE INDEX idx_invoices_paid_date ON invoices (paid, invoice_date, invoice_number)")
+    conn.execute("CREATE INDEX idx_invoices_client ON invoices (client_name)")
+    conn.execute("CREATE INDEX idx_invoices_due ON invoices (paid, due_date)")
+
+
+def _migrate_v3(conn):
+    # Last invoice sequence number handed out per year; see numbering.py
+    conn.execute("CREATE TABLE invoice_sequences (year INTEGER PRIMARY KEY, last INTEGER NOT NULL)")
+
+
+# Applied in order; PRAGMA user_version records how many have run
+_MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3]
+
+
+class InvoiceSummary:
+    """The list-view fields of one invoice, read from the index columns only."""
+
+    def __init__(self, invoice_number, paid, client_name, invoice_date, due_date, grand_total):
+        self.invoice_number = invoice_number
+        self.mark_as_paid = bool(paid)
+        self.client_name = client_name
+        self.invoice_date = invoice_date
+        self.due_date = due_date
+        self.grand_total = grand_total
+
+
+class InvoicePage:
+    def __init__(self, invoices, next_cursor):
+        self.invoices = invoices
+        # Pass back to query(after=...) for the following page; None on the last page
+        self.next_cursor = next_cursor
+
+
+class InvoiceStore:
+    """Invoices kept in SQLite (WAL mode), one row per invoice.
+
+    Saving an invoice is a single-row upsert in its own transaction, so it
+    costs the same with ten invoices on file as with a hundred thousand, and
+    a crash mid-save leaves the previous state intact. On first open an
+    existing invoices.json is imported once; the file itself is left alone.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, legacy_json=LEGACY_JSON_PATH):
+        self.path = os.path.abspath(path)
+        self.legacy_json = legacy_json
+        self._local = threading.local()
+        # A connection's `with` only ends a transaction; closing() releases it
+        with closing(self._connect()) as conn:
+            self._migrate_schema(conn)
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is corruption-safe under WAL; only the last commits can be lost on power failure
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def conn(self):
+        # sqlite3 connections are not shared across threads; Streamlit runs each session in its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _migrate_schema(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock in case another process migrated first
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    conn.execute("ROLLBACK")
+                    continue
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # === WRITES ===
+    def put(self, invoice_data):
+        if not invoice_data.invoice_number:
+            raise Exception("Cannot save an invoice without an invoice number")
+        record = invoice_data.to_dict()
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO invoices (invoice_number, data, created_at, updated_at, paid, client_name, invoice_date, "
+            "due_date, grand_total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(invoice_number) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at, "
+            "paid = excluded.paid, client_name = excluded.client_name, invoice_date = excluded.invoice_date, "
+            "due_date = excluded.due_date, grand_total = excluded.grand_total",
+            (invoice_data.invoice_number, json.dumps(record), now, now) + _index_values(record)
+        )
+
+    def delete(self, invoice_number):
+        cursor = self.conn.execute("DELETE FROM invoices WHERE invoice_number = ?", (invoice_number,))
+        return cursor.rowcount > 0
+
+    def import_json(self, json_path):
+        """Copy invoices from the old invoices.json; runs once per database and source file."""
+        if not os.path.exists(json_path):
+            return 0
+        marker = 'imported:' + os.path.abspath(json_path)
+        conn = self.conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+        with open(json_path, 'r') as f:
+            invoices = json.load(f)
+
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have imported it between the check and the lock
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                conn.execute("ROLLBACK")
+                return 0
+            # Rows already in the database are newer than the JSON file, so they win
+            conn.executemany(
+                "INSERT OR IGNORE INTO invoices (invoice_number, data, created_at, updated_at, paid, client_name, "
+                "invoice_date, due_date, grand_total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(number, json.dumps(record), now, now) + _index_values(record) for number, record in invoices.items()]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(len(invoices))))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(invoices)
+
+    # === READS ===
+    def get(self, invoice_number):
+        row = self.conn.execute("SELECT data FROM invoices WHERE invoice_number = ?", (invoice_number,)).fetchone()
+        if row is None:
+            return None
+        return InvoiceData.from_dict(json.loads(row[0]))
+
+    def load_all(self):
+        rows = self.conn.execute("SELECT invoice_number, data FROM invoices ORDER BY created_at, rowid")
+        return {number: InvoiceData.from_dict(json.loads(data)) for number, data in rows}
+
+    def __contains__(self, invoice_number):
+        return self.conn.execute("SELECT 1 FROM invoices WHERE invoice_number = ?", (invoice_number,)).fetchone() is not None
+
+    def query(self, paid=None, client=None, date_from=None, date_to=None, due_before=None, after=None, limit=25):
+        """One page of invoice summaries, newest invoice date first.
+
+        Filters run in SQLite against indexed columns and pages are keyset
+        based, so each call reads about `limit` rows however many invoices
+        there are. Dates are datetime.date objects; `client` matches a name
+        prefix, case-insensitively.
+        """
+        clauses, params = self._filters(paid, client, date_from, date_to, due_before)
+        if after is not None:
+            clauses.append("(invoice_date, invoice_number) < (?, ?)")
+            params.extend(after)
+        sql = "SELECT invoice_number, paid, client_name, invoice_date, due_date, grand_total FROM invoices"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY invoice_date DESC, invoice_number DESC LIMIT ?"
+        # One extra row tells whether another page follows
+        rows = self.conn.execute(sql, params + [limit + 1]).fetchall()
+        invoices = [InvoiceSummary(*row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = (last[3], last[0])
+        return InvoicePage(invoices, next_cursor)
+
+    def count(self, paid=None, client=None, date_from=None, date_to=None, due_before=None):
+        clauses, params = self._filters(paid, client, date_from, date_to, due_before)
+        sql = "SELECT COUNT(*) FROM invoices"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    @staticmethod
+    def _filters(paid, client, date_from, date_to, due_before):
+        clauses, params = [], []
+        if paid is not None:
+            clauses.append("paid = ?")
+            params.append(1 if paid else 0)
+        if client:
+            # A range on the NOCASE column, which the client_name index can serve (LIKE would scan)
+            clauses.append("client_name >= ? AND client_name < ?")
+            params.extend([client, client + '\U0010ffff'])
+        if date_from is not None:
+            clauses.append("invoice_date >= ?")
+            params.append(date_from.strftime("%Y-%m-%d"))
+        if date_to is not None:
+            clauses.append("invoice_date <= ?")
+            params.append(date_to.strftime("%Y-%m-%d"))
+        if due_before is not None:
+            clauses.append("due_date != '' AND due_date < ?")
+            params.append(due_before.strftime("%Y-%m-%d"))
+        return clauses, params
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = InvoiceStore()
+        return _store
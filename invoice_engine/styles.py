@@ -0,0 +1,231 @@
+import copy
+from functools import lru_cache
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Pt
+
+# Schema order of w:tcPr and w:tcBorders children, for inserting in place
+_TCPR_AFTER_BORDERS = (
+    'w:shd', 'w:noWrap', 'w:tcMar', 'w:textDirection', 'w:tcFitText', 'w:vAlign',
+    'w:hideMark', 'w:headers', 'w:cellIns', 'w:cellDel', 'w:cellMerge', 'w:tcPrChange'
+)
+_TCPR_AFTER_SHADING = _TCPR_AFTER_BORDERS[1:]
+_BORDER_ORDER = ('top', 'start', 'left', 'bottom', 'end', 'right', 'insideH', 'insideV', 'tl2br', 'tr2bl')
+_SIDES = ('top', 'left', 'bottom', 'right')
+# Schema order of w:pPr children that follow the paragraph mark's w:rPr
+_PPR_AFTER_RPR = ('w:sectPr', 'w:pPrChange')
+
+DEFAULT_FONT = "Courier New"
+
+_W_P = qn('w:p')
+_W_R = qn('w:r')
+_W_TCBORDERS = qn('w:tcBorders')
+_W_SHD = qn('w:shd')
+_W_VAL = qn('w:val')
+_W_PPR = qn('w:pPr')
+_W_RPR = qn('w:rPr')
+_W_RFONTS = qn('w:rFonts')
+_W_STYLE = qn('w:style')
+_W_STYLE_ID = qn('w:styleId')
+_DOC_DEFAULT_RPR = './' + '/'.join(qn(tag) for tag in ('w:docDefaults', 'w:rPrDefault', 'w:rPr'))
+_FONT_ATTRS = (qn('w:ascii'), qn('w:hAnsi'), qn('w:eastAsia'))
+
+
+# === FRAGMENT TEMPLATES ===
+# Built once per distinct argument set and cloned onto cells; the cached
+# elements themselves are never inserted into a document.
+@lru_cache(maxsize=None)
+def border_fragment(side, color="FFFFFF", sz=4):
+    return parse_xml(f'<w:{side} {nsdecls("w")} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
+
+
+@lru_cache(maxsize=None)
+def borders_fragment(color="FFFFFF", sz=4):
+    tcBorders = parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>')
+    for side in _SIDES:
+        tcBorders.append(copy.deepcopy(border_fragment(side, color, sz)))
+    return tcBorders
+
+
+@lru_cache(maxsize=None)
+def shading_fragment(fill):
+    return parse_xml(f'<w:shd {nsdecls("w")} w:fill="{fill}" />')
+
+
+@lru_cache(maxsize=None)
+def font_fragments(font_name="Courier New", font_size=10):
+    rPr = parse_xml(f'<w:rPr {nsdecls("w")}><w:rFonts/><w:sz/></w:rPr>')
+    rFonts, sz = rPr[0], rPr[1]
+    for attr in _FONT_ATTRS:
+        rFonts.set(attr, font_name)
+    sz.set(_W_VAL, str(int(Pt(font_size).pt * 2)))
+    return rFonts, sz
+
+
+# === CELL STYLING ===
+def _put_border(tcBorders, border):
+    existing = tcBorders.find(border.tag)
+    if existing is not None:
+        # Restyling a cell replaces its border instead of stacking a duplicate
+        tcBorders.replace(existing, border)
+        return
+    position = _BORDER_ORDER.index(border.tag.rsplit('}', 1)[1])
+    for index, child in enumerate(tcBorders):
+        name = child.tag.rsplit('}', 1)[1]
+        if name in _BORDER_ORDER and _BORDER_ORDER.index(name) > position:
+            tcBorders.insert(index, border)
+            return
+    tcBorders.append(border)
+
+
+def set_tc_borders(tc, color="FFFFFF", sz=4, sides=_SIDES):
+    tcPr = tc.get_or_add_tcPr()
+    tcBorders = tcPr.find(_W_TCBORDERS)
+    if tcBorders is None and sides == _SIDES:
+        tcPr.insert_element_before(copy.deepcopy(borders_fragment(color, sz)), *_TCPR_AFTER_BORDERS)
+        return
+    if tcBorders is None:
+        tcBorders = tcPr.insert_element_before(parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>'), *_TCPR_AFTER_BORDERS)
+    for side in sides:
+        _put_border(tcBorders, copy.deepcopy(border_fragment(side, color, sz)))
+
+
+def set_tc_shading(tc, fill):
+    tcPr = tc.get_or_add_tcPr()
+    shd = copy.deepcopy(shading_fragment(fill))
+    existing = tcPr.find(_W_SHD)
+    if existing is not None:
+        tcPr.replace(existing, shd)
+    else:
+        tcPr.insert_element_before(shd, *_TCPR_AFTER_SHADING)
+
+
+def set_tc_font_size(tc, font_size=10):
+    sz = font_fragments(DEFAULT_FONT, font_size)[1]
+    size = sz.get(_W_VAL)
+    for p in tc.iterchildren(_W_P):
+        for r in p.iterchildren(_W_R):
+            rPr = r.get_or_add_rPr()
+            if rPr.sz is None:
+                rPr._insert_sz(copy.deepcopy(sz))
+            else:
+                rPr.sz.set(_W_VAL, size)
+
+
+def set_tc_font(tc, font_name="Courier New", font_size=10):
+    rFonts, sz = font_fragments(font_name, font_size)
+    size = sz.get(_W_VAL)
+    for p in tc.iterchildren(_W_P):
+        for r in p.iterchildren(_W_R):
+            rPr = r.get_or_add_rPr()
+            # Existing elements keep their other attributes (theme fonts, cs...)
+            if rPr.rFonts is None:
+                rPr._insert_rFonts(copy.deepcopy(rFonts))
+            else:
+                for attr in _FONT_ATTRS:
+                    rPr.rFonts.set(attr, font_name)
+            if rPr.sz is None:
+                rPr._insert_sz(copy.deepcopy(sz))
+            else:
+                rPr.sz.set(_W_VAL, size)
+
+
+def set_cell_border(cell, side, color="FFFFFF", sz=4):
+    side = side.lower()
+    if side in _SIDES:
+        set_tc_borders(cell._tc, color, sz, sides=(side,))
+
+
+def set_white_borders(cell, sz=4):
+    set_tc_borders(cell._tc, "FFFFFF", sz)
+
+
+def set_cell_font(cell, font_name="Courier New", font_size=10):
+    set_tc_font(cell._tc, font_name, font_size)
+
+
+def set_cell_font_size(cell, font_size=10):
+    set_tc_font_size(cell._tc, font_size)
+
+
+def apply_cell_style(cell, bg_color="#ddefd5"):
+    # The typeface comes from the template's document default (set_default_font)
+    set_tc_shading(cell._tc, bg_color)
+    set_white_borders(cell, sz=6)
+    set_cell_font_size(cell)
+
+
+# === DOCUMENT DEFAULTS ===
+def _styles_with_fonts(styles):
+    # Ids of styles that set fonts themselves or through their basedOn chain
+    direct = set()
+    based_on = {}
+    for style in styles.iterchildren(_W_STYLE):
+        style_id = style.get(_W_STYLE_ID)
+        rPr = style.find(_W_RPR)
+        if rPr is not None and rPr.find(_W_RFONTS) is not None:
+            direct.add(style_id)
+        parent = style.find(qn('w:basedOn'))
+        if parent is not None:
+            based_on[style_id] = parent.get(_W_VAL)
+    found = set()
+    for style_id in set(direct) | set(based_on):
+        seen = set()
+        current = style_id
+        while current is not None and current not in seen:
+            if current in direct:
+                found.add(style_id)
+                break
+            seen.add(current)
+            current = based_on.get(current)
+    return found
+
+
+def set_default_font(document, font_name=DEFAULT_FONT, roots=()):
+    """Make font_name the document-wide default that runs without fonts of their own inherit.
+
+    Under `roots`, runs and paragraph marks that showed the old default keep
+    it as explicit fonts, so existing content looks the same, and explicit
+    fonts that merely repeat the new default are dropped.
+    """
+    styles = document.styles.element
+    rPr = styles.find(_DOC_DEFAULT_RPR)
+    if rPr is None:
+        docDefaults = parse_xml(f'<w:docDefaults {nsdecls("w")}><w:rPrDefault><w:rPr/></w:rPrDefault></w:docDefaults>')
+        styles.insert(0, docDefaults)
+        rPr = styles.find(_DOC_DEFAULT_RPR)
+    old_fonts = copy.deepcopy(rPr.rFonts) if rPr.rFonts is not None else None
+    rFonts = rPr.get_or_add_rFonts()
+    for attr in _FONT_ATTRS + (qn('w:cs'),):
+        rFonts.set(attr, font_name)
+    for attr in (qn('w:asciiTheme'), qn('w:hAnsiTheme'), qn('w:eastAsiaTheme'), qn('w:cstheme')):
+        rFonts.attrib.pop(attr, None)
+    new_fonts = dict(rFonts.attrib)
+
+    # Runs whose styles bring their own fonts are left alone
+    styled = _styles_with_fonts(styles)
+    default_paragraph = document.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+    default_style_id = default_paragraph.style_id if default_paragraph is not None else None
+    for root in roots:
+        for p in root.iter(_W_P):
+            pPr = p.find(_W_PPR)
+            if ((pPr.style if pPr is not None else None) or default_style_id) in styled:
+                continue
+            targets = []
+            for r in p.iterchildren(_W_R):
+                targets.append(r.get_or_add_rPr() if old_fonts is not None else r.rPr)
+            mark = pPr.find(_W_RPR) if pPr is not None else None
+            if mark is None and old_fonts is not None:
+                mark = p.get_or_add_pPr().insert_element_before(parse_xml(f'<w:rPr {nsdecls("w")}/>'),
+                                                                *_PPR_AFTER_RPR)
+            targets.append(mark)
+            for run_rPr in targets:
+                if run_rPr is None or run_rPr.style in styled:
+                    continue
+                if run_rPr.rFonts is None:
+                    if old_fonts is not None:
+                        run_rPr._insert_rFonts(copy.deepcopy(old_fonts))
+                elif dict(run_rPr.rFonts.attrib) == new_fonts:
+                    run_rPr.remove(run_rPr.rFonts)
@@ -0,0 +1,271 @@
+import copy
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The bundled template, found next to the package rather than in the working directory
+DEFAULT_TEMPLATE_PATH = os.path.join(_ROOT, 'Invoice_Template_MarketixLab.docx')
+DEFAULT_TEMPLATE = os.environ.get("INVOICE_TEMPLATE", "default")
+# Further templates: every <name>.docx in this directory is available as <name>
+TEMPLATE_DIR = os.environ.get("INVOICE_TEMPLATE_DIR", os.path.join(_ROOT, 'templates'))
+# Compiled templates kept in memory, least recently used evicted first
+MAX_COMPILED_TEMPLATES = int(os.environ.get("INVOICE_TEMPLATE_CACHE", "8"))
+
+REQUIRED_PLACEHOLDERS = ('{{client_name}}', '{{invoice_number}}', '{{invoice_date}}', '{{due_date}}')
+# Cell text that marks the items table's placeholder row and the financial table's rows
+ITEM_ROW_PLACEHOLDER = '{{service_description}}'
+FINANCIAL_PLACEHOLDERS = ('[subtotal]', '[tax]', '[discount]', '[latefee]', '[grandtotal]')
+LATE_FEE_PLACEHOLDER = '[latefee]'
+
+# Parts that carry invoice content and therefore get their own copy per invoice.
+# Every other XML part (styles, settings, theme, fonts...) is shared read-only.
+_PER_INVOICE_PARTS = ('/word/document.xml', '/word/header', '/word/footer')
+
+
+class TemplateError(Exception):
+    pass
+
+
+class CompiledTemplate:
+    """A template parsed once and kept in memory; hands out per-invoice copies.
+
+    Compiling also validates the template: the required placeholders must be
+    present, and the items and financial tables are located by their
+    placeholders rather than by position (items_table, item_row,
+    financial_table, late_fee_row).
+    """
+
+    def __init__(self, path, name=None):
+        # python-docx is only needed once a template is actually compiled
+        from docx import Document
+        from docx.opc.part import XmlPart
+
+        self.path = os.path.abspath(path)
+        self.name = name or os.path.splitext(os.path.basename(self.path))[0]
+        stat = os.stat(self.path)
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        with open(self.path, 'rb') as f:
+            self.blob = f.read()
+        # Identifies the template contents in cache keys for rendered invoices
+        self.version = hashlib.sha256(self.blob).hexdigest()[:16]
+        try:
+            self._document = Document(io.BytesIO(self.blob))
+        except Exception as e:
+            raise TemplateError(f"{self.path} is not a readable .docx: {e}")
+        self._locate_layout()
+        # Things derived from this template (the streaming renderer) that live and die with it
+        self.compiled = {}
+        self._shared = {}
+        for part in self._document.part.package.iter_parts():
+            if isinstance(part, XmlPart) and not part.partname.startswith(_PER_INVOICE_PARTS):
+                self._shared[id(part._element)] = part._element
+        self._apply_default_font()
+        self._index_static_members()
+
+    def _locate_layout(self):
+        from docx.table import Table
+
+        from .placeholders import find_placeholders
+
+        self.placeholders = frozenset(find_placeholders(self._document))
+        missing = [token for token in REQUIRED_PLACEHOLDERS + FINANCIAL_PLACEHOLDERS + (ITEM_ROW_PLACEHOLDER,)
+                   if token not in self.placeholders]
+        if missing:
+            raise TemplateError(f"{self.name}: missing placeholders {', '.join(missing)}")
+        self.items_table = self.item_row = self.financial_table = self.late_fee_row = None
+        # Not self._document.tables: that caches a body proxy, which new_document()
+        # would then deep-copy apart from the document it belongs to
+        for table_index, tbl in enumerate(self._document.element.body.tbl_lst):
+            table = Table(tbl, None)
+            rows = [[cell.text for cell in row.cells] for row in table.rows]
+            for row_index, cells in enumerate(rows):
+                if cells and ITEM_ROW_PLACEHOLDER in cells[0]:
+                    if len(cells) != 4:
+                        raise TemplateError(f"{self.name}: the item row needs 4 cells "
+                                            "(description, unit price, quantity, total)")
+                    self.items_table, self.item_row = table_index, row_index
+            table_text = ' '.join(' '.join(cells) for cells in rows)
+            if all(token in table_text for token in FINANCIAL_PLACEHOLDERS):
+                self.financial_table = table_index
+                self.late_fee_row = next(row_index for row_index, cells in enumerate(rows)
+                                         if LATE_FEE_PLACEHOLDER in ' '.join(cells))
+        if self.items_table is None:
+            raise TemplateError(f"{self.name}: {ITEM_ROW_PLACEHOLDER} must start a row of the items table")
+        if self.financial_table is None or self.financial_table == self.items_table:
+            raise TemplateError(f"{self.name}: the financial placeholders must share a table of their own")
+
+    def _apply_default_font(self):
+        # Courier New as the document default, once, instead of on every run of every render
+        from .styles import DEFAULT_FONT, set_default_font
+
+        roots = [part.element for part in self._document.part.package.iter_parts()
+                 if part.partname.startswith(_PER_INVOICE_PARTS)]
+        set_default_font(self._document, DEFAULT_FONT, roots)
+        self._modified = {self._document.part._styles_part.partname}
+
+    def _index_static_members(self):
+        # The stored (compressed) zip entry of every part an invoice normally
+        # leaves alone: shared XML parts and binary parts such as the logo.
+        # Parts changed while compiling, and members the template zip keeps
+        # uncompressed (Word stores media that way), are deflated here, once.
+        from docx.opc.part import XmlPart
+
+        from .reproducible import compress_static_member, read_static_member
+
+        self._static = {}
+        with zipfile.ZipFile(io.BytesIO(self.blob)) as zf:
+            names = set(zf.namelist())
+            for part in self._document.part.package.iter_parts():
+                if part.partname.membername not in names:
+                    continue
+                if isinstance(part, XmlPart):
+                    if id(part._element) not in self._shared:
+                        continue
+                    source = part._element
+                else:
+                    source = part.blob
+                info = zf.getinfo(part.partname.membername)
+                if part.partname in self._modified or info.compress_type == zipfile.ZIP_STORED:
+                    member = compress_static_member(part.partname.membername, part.blob)
+                else:
+                    member = read_static_member(zf, info)
+                self._static[part.partname] = (source, member)
+
+    def static_member(self, part):
+        """The template's stored entry for `part` if the invoice still has it unchanged, else None."""
+        entry = self._static.get(part.partname)
+        if entry is None:
+            return None
+        source, member = entry
+        if isinstance(source, bytes):
+            unchanged = part.blob == source
+        else:
+            unchanged = getattr(part, '_element', None) is source
+        return member if unchanged else None
+
+    def is_stale(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return (stat.st_mtime_ns, stat.st_size) != (self.mtime_ns, self.size)
+
+    def new_document(self):
+        # Seeding the memo makes deepcopy reuse the read-only part trees instead
+        # of copying them, so only the document/header/footer XML is duplicated.
+        return copy.deepcopy(self._document, dict(self._shared))
+
+
+# === REGISTRY ===
+class TemplateRegistry:
+    """Invoice templates by name, compiled on first use and kept least recently used.
+
+    'default' is the bundled template unless TEMPLATE_DIR has a default.docx;
+    every other <name>.docx in TEMPLATE_DIR is <name>. A name may also be a
+    path to a .docx. Templates are validated when compiled, recompiled when
+    their file changes, and at most `max_compiled` stay in memory.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, default_path=DEFAULT_TEMPLATE_PATH,
+                 max_compiled=MAX_COMPILED_TEMPLATES):
+        self.template_dir = template_dir
+        self.default_path = os.path.abspath(default_path)
+        self.max_compiled = max(1, max_compiled)
+        self._lock = threading.Lock()
+        self._compiled = OrderedDict()
+        self._paths = {}
+        self._scanned_mtime = None
+
+    def _discover(self):
+        # Rescanned only when the directory itself changes (a template added or removed)
+        try:
+            mtime = os.stat(self.template_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._paths and mtime == self._scanned_mtime:
+            return self._paths
+        paths = {'default': self.default_path}
+        if mtime is not None:
+            for entry in sorted(os.scandir(self.template_dir), key=lambda entry: entry.name):
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() == '.docx' and entry.is_file() and not stem.startswith(('~$', '.')):
+                    paths[stem] = os.path.abspath(entry.path)
+        self._paths = paths
+        self._scanned_mtime = mtime
+        return paths
+
+    def names(self):
+        with self._lock:
+            return sorted(self._discover())
+
+    def path(self, name=None):
+        name = name or DEFAULT_TEMPLATE
+        with self._lock:
+            path = self._discover().get(name)
+        if path is None and name.lower().endswith('.docx') and os.path.isfile(name):
+            path = os.path.abspath(name)
+        if path is None:
+            raise TemplateError(f"Unknown invoice template {name!r}")
+        return path
+
+    def get(self, name=None):
+        """The compiled template for a name (or .docx path); None or '' is the default."""
+        name = name or DEFAULT_TEMPLATE
+        path = self.path(name)
+        return self.load(path, None if name.lower().endswith('.docx') else name)
+
+    def load(self, path, name=None):
+        key = os.path.abspath(path)
+        with self._lock:
+            template = self._compiled.get(key)
+            if template is None or template.is_stale():
+                if not os.path.isfile(key):
+                    raise TemplateError(f"Invoice template {key} does not exist")
+                template = CompiledTemplate(key, name)
+                self._compiled[key] = template
+            self._compiled.move_to_end(key)
+            while len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+            return template
+
+    def validate(self):
+        """{name: error message or None} for every discovered template."""
+        results = {}
+        for name in self.names():
+            try:
+                self.get(name)
+                results[name] = None
+            except Exception as e:
+                results[name] = str(e)
+        return results
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
+
+
+def get_template(name=None):
+    return get_template_registry().get(name)
+
+
+def template_for(invoice_data):
+    # The template an invoice asked for; older saved invoices have none and get the default
+    return get_template_registry().get(getattr(invoice_data, 'template', None))
+
+
+def load_template(path=DEFAULT_TEMPLATE_PATH):
+    return get_template_registry().load(path)
@@ -1,164 +1,21 @@
-import docx
-from docx import Document
 from datetime import datetime
-import uuid
-from docx.oxml.ns import qn
-from docx.shared import Pt, RGBColor
-from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from tkcalendar import DateEntry
-import os
-
-class InvoiceData:
-    def __init__(self):
-        self.client_info = {}
-        self.invoice_details = {}
-        self.items = []
-        self.financials = {}
-        self.apply_late_fee = False
-        self.invoice_number = ""
-
-def format_currency(amount):
-    if amount == 0:
-        return ""
-    elif amount == int(amount):
-        return f"Rp {int(amount):,}"
-    else:
-        return f"Rp {amount:,.2f}"
-
-def set_cell_border(cell, side, color="FFFFFF", sz=4):
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    side_mapping = {
-        'top': 'top', 'bottom': 'bottom', 'left': 'left', 'right': 'right'
-    }
-    border_name = side_mapping.get(side.lower())
-    if border_name:
-        border = parse_xml(f'<w:{border_name} {nsdecls("w")} w:val="single" w:sz="{sz}" w:space="0" w:color="{color}"/>')
-        tcBorders = tcPr.first_child_found_in("w:tcBorders")
-        if tcBorders is None:
-            tcBorders = parse_xml(f'<w:tcBorders {nsdecls("w")}></w:tcBorders>')
-            tcPr.append(tcBorders)
-        tcBorders.append(border)
-
-def set_white_borders(cell, sz=4):
-    for border in ['top', 'bottom', 'left', 'right']:
-        set_cell_border(cell, border, color="FFFFFF", sz=sz)
-
-def set_cell_font(cell, font_name="Courier New", font_size=10):
-    for paragraph in cell.paragraphs:
-        for run in paragraph.runs:
-            run.font.name = font_name
-            run.font.size = Pt(font_size)
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
-
-def apply_cell_style(cell, bg_color="#ddefd5"):
-    shading_elm = parse_xml(f'<w:shd {nsdecls("w")} w:fill="{bg_color}" />')
-    cell._tc.get_or_add_tcPr().append(shading_elm)
-    set_white_borders(cell, sz=6)
-    set_cell_font(cell)
-
-def replace_placeholders(doc, replacements):
-    for paragraph in doc.paragraphs:
-        for key, value in replacements.items():
-            if key in paragraph.text:
-                paragraph.text = paragraph.text.replace(key, value)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for key, value in replacements.items():
-                    if key in cell.text:
-                        cell.text = cell.text.replace(key, value)
-    return doc
-
-def update_items_table(doc, items):
-    items_table = doc.tables[0]
-    for i in range(len(items_table.rows)):
-        for cell in items_table.rows[i].cells:
-            set_white_borders(cell, sz=6)
-    while len(items_table.rows) > 2:
-        items_table._tbl.remove(items_table.rows[2]._tr)
-    placeholder_row = items_table.rows[1]
-    for item in items:
-        row = items_table.add_row()
-        row.cells[0].text = item['description']
-        row.cells[1].text = format_currency(item['unit_price'])
-        quantity = item['quantity']
-        if quantity == int(quantity):
-            row.cells[2].text = str(int(quantity))
-        else:
-            row.cells[2].text = str(quantity)
-        row.cells[3].text = format_currency(item['total'])
-        for i, cell in enumerate(row.cells):
-            apply_cell_style(cell)
-            alignments = [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.RIGHT,
-                         WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = alignments[i]
-    items_table._tbl.remove(placeholder_row._tr)
-    return doc
-
-def style_financial_table(doc, invoice_data):
-    financial_table = doc.tables[1]
-    for row in financial_table.rows:
-        for cell in row.cells:
-            set_white_borders(cell)
-            set_cell_font(cell)
-        for paragraph in row.cells[1].paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    if invoice_data.apply_late_fee:
-        late_fee_cell = financial_table.rows[3].cells[0]
-        if "LATE FEE" in late_fee_cell.text:
-            original_text = late_fee_cell.text
-            late_fee_cell.text = ""
-            paragraph = late_fee_cell.paragraphs[0]
-            run = paragraph.add_run(original_text)
-            run.font.color.rgb = RGBColor.from_string('d95132')
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
+from invoice_engine.document import InvoiceData, render_docx
+from invoice_engine.model import compute_financials
+from invoice_engine.numbering import get_allocator, is_valid_invoice_number
+from invoice_engine.metrics import start_metrics_server
 
 def generate_invoice(invoice_data):
-    doc = Document('Invoice_Template_MarketixLab.docx')
-    replacements = {**invoice_data.client_info, **invoice_data.invoice_details, **invoice_data.financials}
-    if invoice_data.apply_late_fee:
-        replacements['{{LATE FEE:}}'] = 'LATE FEE'
-    else:
-        replacements['{{LATE FEE:}}'] = ''
-        replacements['[latefee]'] = ''
-    doc = replace_placeholders(doc, replacements)
-    doc = update_items_table(doc, invoice_data.items)
-    style_financial_table(doc, invoice_data)
-    for paragraph in doc.paragraphs:
-        for run in paragraph.runs:
-            run.font.name = "Courier New"
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), "Courier New")
+    # Rendering, styling and metrics are shared with the web app through invoice_engine
     output_filename = f"Invoice_{invoice_data.invoice_number}.docx"
-    doc.save(output_filename)
+    docx_bytes = render_docx(invoice_data, "desktop")
+    with open(output_filename, 'wb') as f:
+        f.write(docx_bytes)
     messagebox.showinfo("Success", f"Invoice saved as {output_filename}")
 
-def get_next_invoice_number():
-    count_file = "invoice_count.txt"
-    year = "2025"
-    if os.path.exists(count_file):
-        with open(count_file, 'r') as f:
-            try:
-                count = int(f.read().strip())
-            except ValueError:
-                count = 0
-    else:
-        count = 0
-    count += 1
-    return f"INV{year}{count:03d}", count
-
-def save_invoice_count(count):
-    with open("invoice_count.txt", 'w') as f:
-        f.write(str(count))
-
 class InvoiceApp:
     def __init__(self, root):
         self.root = root
@@ -252,8 +109,8 @@ class InvoiceApp:
         ttk.Label(frame, text="Invoice Number:").grid(row=0, column=0, sticky='w', pady=5, padx=5)
         self.invoice_number = ttk.Entry(frame, width=30)
         self.invoice_number.grid(row=0, column=1, sticky='w', pady=5, padx=5)
-        next_invoice_number, _ = get_next_invoice_number()
-        self.invoice_number.insert(0, next_invoice_number)
+        self.suggested_invoice_number = get_allocator().peek()
+        self.invoice_number.insert(0, self.suggested_invoice_number)
 
         ttk.Label(frame, text="Invoice Date:").grid(row=1, column=0, sticky='w', pady=5, padx=5)
         self.use_today = tk.IntVar(value=1)
@@ -356,8 +213,8 @@ class InvoiceApp:
                 messagebox.showerror("Error", "All client info fields are required")
                 return
             self.invoice_data.invoice_number = self.invoice_number.get()
-            if not self.invoice_data.invoice_number.startswith("INV2025"):
-                messagebox.showerror("Error", "Invoice number must start with 'INV2025'")
+            if not is_valid_invoice_number(self.invoice_data.invoice_number):
+                messagebox.showerror("Error", f"Invoice number must be 'INV', the year and a sequence number (e.g., {self.suggested_invoice_number})")
                 return
             if self.use_today.get() == 1:
                 invoice_date = datetime.now().strftime("%d.%m.%Y")
@@ -389,29 +246,29 @@ class InvoiceApp:
                 return
             subtotal = sum(item['total'] for item in self.invoice_data.items)
             try:
-                tax_rate = float(self.tax_rate.get()) / 100
+                tax_rate = float(self.tax_rate.get())
                 discount = float(self.discount.get().replace(',', ''))
             except ValueError:
                 messagebox.showerror("Error", "Tax rate and discount must be numbers")
                 return
-            tax = subtotal * tax_rate
             self.invoice_data.apply_late_fee = bool(self.late_fee_var.get())
-            late_fee = subtotal * 0.02 if self.invoice_data.apply_late_fee else 0
-            total = subtotal + tax - discount + late_fee
-            self.invoice_data.financials = {
-                '[subtotal]': format_currency(subtotal),
-                '[tax]': format_currency(tax),
-                '[discount]': format_currency(discount),
-                '[latefee]': format_currency(late_fee),
-                '[grandtotal]': format_currency(total)
-            }
+            self.invoice_data.financials = compute_financials(subtotal, tax_rate, discount,
+                                                              self.invoice_data.apply_late_fee)
+            if self.invoice_data.invoice_number == self.suggested_invoice_number:
+                # The web app may have used the suggested number since this window opened
+                self.invoice_data.invoice_number = get_allocator().allocate()
+                self.invoice_data.invoice_details['{{invoice_number}}'] = self.invoice_data.invoice_number
+            else:
+                get_allocator().observe(self.invoice_data.invoice_number)
             generate_invoice(self.invoice_data)
-            _, count = get_next_invoice_number()
-            save_invoice_count(count)
+            self.suggested_invoice_number = get_allocator().peek()
+            self.invoice_number.delete(0, tk.END)
+            self.invoice_number.insert(0, self.suggested_invoice_number)
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
 def main():
+    start_metrics_server()
     root = tk.Tk()
     app = InvoiceApp(root)
     root.mainloop()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.run_suite import install_local_assets
+
+
+@pytest.fixture
+def local_assets(tmp_path):
+    # Generated stamp and signature images in place of the network
+    from invoice_engine import assets
+
+    previous = assets._cache
+    install_local_assets(str(tmp_path))
+    yield
+    assets._cache = previous
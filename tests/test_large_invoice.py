@@ -0,0 +1,13 @@
+from benchmarks.bench_large_invoice import probe, write_items_csv
+
+# The whole item list held in memory grows ~7 MB over the same range
+GROWTH_SLACK_MB = 1.0
+
+
+def test_streamed_peak_flat_in_item_count(tmp_path):
+    peaks = {}
+    for count in (1000, 20000):
+        items_path = str(tmp_path / f'items-{count}.csv')
+        write_items_csv(items_path, count)
+        peaks[count] = probe('stream', items_path, str(tmp_path / 'invoice.docx'))['peak_mb']
+    assert peaks[20000] - peaks[1000] <= GROWTH_SLACK_MB, peaks
@@ -0,0 +1,14 @@
+import pytest
+
+from benchmarks import bench_startup
+
+
+@pytest.mark.parametrize('module', bench_startup.MODULES)
+def test_engine_import_stays_light(module):
+    assert bench_startup.problems(bench_startup.probe(module, 1)) == []
+
+
+def test_app_import_within_budget(tmp_path):
+    pytest.importorskip('streamlit')
+    result = bench_startup.probe_app(5, str(tmp_path))
+    assert result['median_ms'] <= bench_startup.APP_BUDGET_MS, result
@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks.run_suite import sample_invoice
+from invoice_engine.document import render_docx
+from invoice_engine.ooxml import StreamingRenderer
+
+
+@pytest.mark.parametrize('paid', [False, True])
+@pytest.mark.parametrize('late', [False, True])
+def test_streaming_matches_pipeline(local_assets, late, paid):
+    invoice_data = sample_invoice(5, paid=paid, late=late)
+    assert StreamingRenderer().render(invoice_data).getvalue() == render_docx(invoice_data)
+
+
+def test_streaming_matches_pipeline_on_awkward_values(local_assets):
+    invoice_data = sample_invoice(4, paid=False, late=False)
+    invoice_data.client_info['{{client_name}}'] = ''
+    invoice_data.client_info['{{client_address}}'] = ' Jl. Sudirman No. 1\r\nJakarta\t12190 '
+    invoice_data.items[0]['description'] = ''
+    invoice_data.items[1]['description'] = 'Line one\nline two\t'
+    invoice_data.items[2]['description'] = '  Indented & <escaped>'
+    assert StreamingRenderer().render(invoice_data).getvalue() == render_docx(invoice_data)